@@ -0,0 +1,115 @@
+"""
+Shared pytest fixtures for the Wake ABC Telegram Bot setup and notification tests
+Heavy objects are built once per test session and reused by every test
+
+The bot's modules are imported inside the fixtures, so a missing dependency
+skips the tests that need it and test_dependencies can still report it
+"""
+
+import asyncio
+import os
+
+import pytest
+import pytest_asyncio
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--user-id",
+        type=int,
+        action="append",
+        default=[],
+        help="Telegram user ID to send the test notification to (repeatable)",
+    )
+    parser.addoption(
+        "--network",
+        action="store_true",
+        help="Also run tests marked network, which use live services",
+    )
+    parser.addoption(
+        "--deep",
+        action="store_true",
+        help="Import every required module instead of only locating it",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    # Live-service tests only run when asked for, by flag or environment
+    if config.getoption("--network") or os.getenv("RUN_NETWORK_TESTS") == "1":
+        return
+
+    skip_network = pytest.mark.skip(reason="Needs --network or RUN_NETWORK_TESTS=1")
+    for item in items:
+        if "network" in item.keywords:
+            item.add_marker(skip_network)
+
+
+def pytest_asyncio_loop_factories(config, item):
+    # Async tests run on the same loop as the bot: uvloop where installed
+    try:
+        from wakeabcbot.utils import new_event_loop
+    except ImportError:
+        return {"app": asyncio.new_event_loop}
+    return {"app": new_event_loop}
+
+
+@pytest.fixture(scope="session")
+def config():
+    """Validated configuration, with secure logging set up"""
+    Config = pytest.importorskip("wakeabcbot.config").Config
+    Config.setup_logging()
+    Config.validate_config()
+    return Config
+
+
+@pytest.fixture(scope="session")
+def bot(config):
+    """Telegram bot using the configured token"""
+    Bot = pytest.importorskip("telegram").Bot
+    return Bot(token=config.TELEGRAM_BOT_TOKEN)
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def monitoring_service(config):
+    """Monitoring service whose bot connection is reused by every notification test"""
+    MonitoringService = pytest.importorskip("wakeabcbot.monitor").MonitoringService
+    service = MonitoringService(config.TELEGRAM_BOT_TOKEN)
+    yield service
+    await service.stop()
+
+
+@pytest.fixture(scope="session")
+def scraper():
+    """Inventory scraper shared by every test"""
+    WakeABCInventoryScraper = pytest.importorskip(
+        "wakeabcbot.inventory_scraper"
+    ).WakeABCInventoryScraper
+    scraper = WakeABCInventoryScraper()
+    yield scraper
+    scraper.session.close()
+
+
+@pytest.fixture(scope="session")
+def pristine_db():
+    """Empty in-memory database, with the schema created once per session"""
+    Database = pytest.importorskip("wakeabcbot.database").Database
+    db = Database(":memory:")
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def db(pristine_db):
+    """Fresh copy of the empty database for each test"""
+    db = pristine_db.copy()
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope="session")
+def user_ids(request):
+    """Telegram user IDs given with --user-id; tests needing them are skipped without one"""
+    user_ids = request.config.getoption("--user-id")
+    if not user_ids:
+        pytest.skip("No --user-id given")
+    return user_ids
@@ -3,9 +3,8 @@
 Simple run script for Wake ABC Telegram Bot
 """
 
-import asyncio
-
 from wakeabcbot.main import main
+from wakeabcbot.utils import run_async
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_async(main())
@@ -4,7 +4,11 @@ Handles bot commands and user interactions
 """
 
 import asyncio
+import html
 import logging
+import re
+from functools import partial
+from typing import Optional, Tuple
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.constants import ParseMode
@@ -21,18 +25,58 @@ from .config import Config
 from .database import Database
 from .inventory_scraper import WakeABCInventoryScraper
 from .message_loader import message_loader
+from .rate_limiter import TelegramRateLimiter
+from .utils import run_async
 
 logger = logging.getLogger(__name__)
 
+# Plain-text messages that look like a question get pointed at /help
+_TRIGGER_RE = re.compile(r"\b(?:help|how|what)\b", re.IGNORECASE)
+
 
 class WakeABCBot:
     """Main bot class"""
 
-    def __init__(self):
-        """Initialize the bot"""
+    # Watchlist action buttons, with and without "Clear All"
+    _WATCHLIST_EMPTY_MARKUP = InlineKeyboardMarkup(
+        [[InlineKeyboardButton("➕ Add Item", callback_data="show_add_help")]]
+    )
+    _WATCHLIST_FULL_MARKUP = InlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton("🗑️ Clear All", callback_data="clear_watchlist")],
+            [InlineKeyboardButton("➕ Add Item", callback_data="show_add_help")],
+        ]
+    )
+
+    # Yes/Cancel buttons shown before clearing a watchlist
+    _CONFIRM_CLEAR_MARKUP = InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    "✅ Yes, clear all", callback_data="confirm_clear_watchlist"
+                ),
+                InlineKeyboardButton(
+                    "❌ Cancel", callback_data="cancel_clear_watchlist"
+                ),
+            ]
+        ]
+    )
+
+    def __init__(
+        self,
+        scraper: Optional[WakeABCInventoryScraper] = None,
+        rate_limiter: Optional[TelegramRateLimiter] = None,
+    ):
+        """Initialize the bot, optionally sharing another component's scraper"""
         self.db = Database()
-        self.scraper = WakeABCInventoryScraper()
+        # A scraper passed in is owned, and closed, by the caller
+        self._owns_scraper = scraper is None
+        self.scraper = scraper or WakeABCInventoryScraper()
+        # Shared with the monitor when both run, so all sends count against
+        # one concurrency cap and one flood-control pause
+        self.rate_limiter = rate_limiter or TelegramRateLimiter()
         self.application = None
+        self._inflight = {}
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -40,7 +84,8 @@ class WakeABCBot:
 
         # Add user to database
         try:
-            self.db.add_user(
+            await asyncio.to_thread(
+                self.db.add_user,
                 user_id=user.id,
                 username=user.username,
                 first_name=user.first_name,
@@ -87,7 +132,7 @@ class WakeABCBot:
         )
 
         # Update the searching message with results
-        parse_mode = ParseMode.MARKDOWN if not items else ParseMode.MARKDOWN_V2
+        parse_mode = ParseMode.MARKDOWN if not items else ParseMode.HTML
         await searching_msg.edit_text(
             results_message,
             parse_mode=parse_mode,
@@ -125,7 +170,7 @@ class WakeABCBot:
         Returns tuple of (items, formatted_message, reply_markup)
         """
         try:
-            items = self.scraper.search_inventory(keyword, max_results=max_results)
+            items = await self._search_inventory_cached(keyword, max_results)
         except Exception as e:
             logger.error(f"Error during search for '{keyword}': {e}")
             error_message = "❌ Sorry, there was an error searching the inventory. Please try again later."
@@ -140,18 +185,20 @@ class WakeABCBot:
                 message = f"❌ No items found for '{keyword}'."
             return [], message, None
 
-        # Format results message
+        # Format results message (HTML, so only <, > and & need escaping)
+        keyword_escaped = html.escape(keyword, quote=False)
+        parts = [f"🔍 <b>Search Results for '{keyword_escaped}':</b>\n\n"]
         if include_watchlist_button:
-            # MarkdownV2 format for search command (with escaping)
-            results_message = f"🔍 *Search Results for '{keyword}':*\n\n"
             display_limit = 5
             for i, item in enumerate(items[:display_limit], 1):
-                results_message += (
-                    f"*{i}\\.* {self.scraper.format_item_for_display(item)}\n\n"
+                parts.append(
+                    f"<b>{i}.</b> {self.scraper.format_item_for_display_html(item)}\n\n"
                 )
 
             if len(items) > display_limit:
-                results_message += f"_\\.\\.\\. and {len(items) - display_limit} more result{'s' if len(items) - display_limit != 1 else ''}_\n\n"
+                parts.append(
+                    f"<i>... and {len(items) - display_limit} more result{'s' if len(items) - display_limit != 1 else ''}</i>\n\n"
+                )
 
             # Add watchlist suggestion and button
             keyboard = [
@@ -163,18 +210,48 @@ class WakeABCBot:
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            results_message += "💡 *Tip:* Add this search to your watchlist to get notified when new items become available\\!"
+            parts.append(
+                "💡 <b>Tip:</b> Add this search to your watchlist to get notified when new items become available!"
+            )
         else:
-            # Regular Markdown format for callbacks (no escaping needed)
-            results_message = f"🔍 **Search Results for '{keyword}':**\n\n"
             for i, item in enumerate(items, 1):
-                results_message += (
-                    f"**{i}.** {self.scraper.format_item_for_display(item)}\n\n"
+                parts.append(
+                    f"<b>{i}.</b> {self.scraper.format_item_for_display_html(item)}\n\n"
                 )
             reply_markup = None
 
+        results_message = "".join(parts)
         return items, results_message, reply_markup
 
+    async def _search_inventory_cached(self, keyword: str, max_results: int):
+        """Search the inventory, sharing one scrape between identical searches"""
+        # Recent results are cached by the scraper itself
+        key = (keyword.strip().lower(), max_results)
+
+        # Join an identical search that is already running instead of
+        # scraping the same page again
+        task = self._inflight.get(key)
+        if task is None:
+            # The scrape runs as its own task, so a caller that is cancelled
+            # only stops waiting and everyone else who joined still gets the
+            # results
+            task = asyncio.create_task(
+                self.scraper.search_inventory_async(keyword, max_results=max_results)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._search_done, key))
+
+        return await asyncio.shield(task)
+
+    def _search_done(self, key: Tuple[str, int], task: asyncio.Task):
+        """Forget a finished in-flight search"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # Mark the exception as retrieved in case nobody was left waiting
+        if not task.cancelled():
+            task.exception()
+
     async def _get_watchlist_display(
         self, user_id: int, include_tips: bool = False, include_buttons: bool = False
     ):
@@ -183,7 +260,7 @@ class WakeABCBot:
         Returns tuple of (keywords, formatted_message, reply_markup, error)
         """
         try:
-            keywords = self.db.get_user_watchlist(user_id)
+            keywords = await asyncio.to_thread(self.db.get_user_watchlist, user_id)
         except Exception as e:
             logger.error(f"Error getting watchlist for user {user_id}: {e}")
             error_message = "❌ Sorry, there was an error retrieving your watchlist. Please try again later."
@@ -197,32 +274,26 @@ class WakeABCBot:
                 # Simple empty message for callbacks
                 message = "📝 **Your watchlist is empty.**"
         else:
-            message = f"📝 **Your Watchlist ({len(keywords)} items):**\n\n"
+            parts = [f"📝 **Your Watchlist ({len(keywords)} items):**\n\n"]
             for i, keyword in enumerate(keywords, 1):
-                message += f"{i}. `{keyword}`\n"
+                parts.append(f"{i}. `{keyword}`\n")
 
             if include_tips:
-                message += f"\n{message_loader.get_watchlist_tips(Config.CHECK_INTERVAL_MINUTES)}"
+                parts.append(
+                    f"\n{message_loader.get_watchlist_tips(Config.CHECK_INTERVAL_MINUTES)}"
+                )
+            message = "".join(parts)
 
         # Create buttons if requested
         reply_markup = None
         if include_buttons:
-            keyboard = []
-            if keywords:  # Only show "Clear All" if there are items
-                keyboard.append(
-                    [
-                        InlineKeyboardButton(
-                            "🗑️ Clear All", callback_data="clear_watchlist"
-                        )
-                    ]
-                )
-
-            keyboard.append(
-                [InlineKeyboardButton("➕ Add Item", callback_data="show_add_help")]
+            # Only show "Clear All" if there are items
+            reply_markup = (
+                self._WATCHLIST_FULL_MARKUP
+                if keywords
+                else self._WATCHLIST_EMPTY_MARKUP
             )
 
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
         return keywords, message, reply_markup, None
 
     async def _add_keyword_to_watchlist(self, user_id: int, keyword: str):
@@ -231,7 +302,9 @@ class WakeABCBot:
         Returns tuple of (success, message, reply_markup)
         """
         try:
-            success = self.db.add_watchlist_keyword(user_id, keyword)
+            success = await asyncio.to_thread(
+                self.db.add_watchlist_keyword, user_id, keyword
+            )
         except Exception as e:
             logger.error(f"Error adding keyword '{keyword}' for user {user_id}: {e}")
             error_message = "❌ Sorry, there was an error adding the keyword. Please try again later."
@@ -290,7 +363,9 @@ class WakeABCBot:
         user = update.effective_user
 
         try:
-            success = self.db.remove_watchlist_keyword(user.id, keyword)
+            success = await asyncio.to_thread(
+                self.db.remove_watchlist_keyword, user.id, keyword
+            )
         except Exception as e:
             logger.error(f"Error removing keyword '{keyword}' for user {user.id}: {e}")
             await update.message.reply_text(
@@ -305,13 +380,26 @@ class WakeABCBot:
 
         await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
 
+    def _build_clear_confirmation(self, current_keywords):
+        """Build the clear-watchlist confirmation message and its buttons"""
+        message = (
+            f"⚠️ **Clear Watchlist Confirmation**\n\n"
+            f"Are you sure you want to clear your entire watchlist?\n\n"
+            f"This will remove **{len(current_keywords)} item{'s' if len(current_keywords) != 1 else ''}**:\n"
+            f"• {', '.join(current_keywords)}\n\n"
+            f"This action cannot be undone."
+        )
+        return message, self._CONFIRM_CLEAR_MARKUP
+
     async def clear_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /clear command to clear entire watchlist"""
         user = update.effective_user
 
         # First, check if user has any watchlist items
         try:
-            current_keywords = self.db.get_user_watchlist(user.id)
+            current_keywords = await asyncio.to_thread(
+                self.db.get_user_watchlist, user.id
+            )
         except Exception as e:
             logger.error(f"Error getting watchlist for user {user.id}: {e}")
             await update.message.reply_text(
@@ -327,158 +415,160 @@ class WakeABCBot:
             return
 
         # Show confirmation with inline buttons
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    "✅ Yes, clear all", callback_data="confirm_clear_watchlist"
-                ),
-                InlineKeyboardButton(
-                    "❌ Cancel", callback_data="cancel_clear_watchlist"
-                ),
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message, reply_markup = self._build_clear_confirmation(current_keywords)
 
-        message = (
-            f"⚠️ **Clear Watchlist Confirmation**\n\n"
-            f"Are you sure you want to clear your entire watchlist?\n\n"
-            f"This will remove **{len(current_keywords)} item{'s' if len(current_keywords) != 1 else ''}**:\n"
-            f"• {', '.join(current_keywords)}\n\n"
-            f"This action cannot be undone."
+        await update.message.reply_text(
+            message, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup
         )
 
-        await update.message.reply_text(
+    async def answer_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Acknowledge every inline button press before any handler does work"""
+        await update.callback_query.answer()
+
+    async def _on_add_watch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Add a keyword to the watchlist from a search result button"""
+        query = update.callback_query
+        user = update.effective_user
+        data = query.data
+
+        keyword = data.replace("add_watch:", "")
+        success, message, reply_markup = await self._add_keyword_to_watchlist(
+            user.id, keyword
+        )
+
+        # For callback queries, we edit the message instead of replying
+        await query.edit_message_text(
             message, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup
         )
 
-    async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle inline button callbacks"""
+    async def _on_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Run a search from an inline button"""
         query = update.callback_query
-        await query.answer()
+        data = query.data
+
+        keyword = data.replace("search:", "")
+        await query.edit_message_text(f"🔍 Searching for '{keyword}'...")
+
+        # Use helper method to perform search
+        items, results_message, reply_markup = await self._search_inventory_helper(
+            keyword=keyword, max_results=5, include_watchlist_button=False
+        )
+
+        await query.edit_message_text(
+            results_message,
+            parse_mode=ParseMode.HTML if items else ParseMode.MARKDOWN,
+            reply_markup=reply_markup,
+        )
 
+    async def _on_show_watchlist(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        """Show the watchlist from an inline button"""
+        query = update.callback_query
         user = update.effective_user
-        data = query.data
 
-        if data.startswith("add_watch:"):
-            keyword = data.replace("add_watch:", "")
-            success, message, reply_markup = await self._add_keyword_to_watchlist(
-                user.id, keyword
-            )
+        # Use helper method to get watchlist display
+        keywords, message, reply_markup, error = await self._get_watchlist_display(
+            user_id=user.id, include_tips=False, include_buttons=False
+        )
 
-            # For callback queries, we edit the message instead of replying
-            await query.edit_message_text(
-                message, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup
-            )
+        if error:
+            # Error occurred, show error message
+            await query.edit_message_text(message)
+        else:
+            await query.edit_message_text(message, parse_mode=ParseMode.MARKDOWN)
 
-        elif data.startswith("search:"):
-            keyword = data.replace("search:", "")
-            await query.edit_message_text(f"🔍 Searching for '{keyword}'...")
+    async def _on_show_add_help(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        """Show help for adding keywords"""
+        query = update.callback_query
 
-            # Use helper method to perform search
-            items, results_message, reply_markup = await self._search_inventory_helper(
-                keyword=keyword, max_results=5, include_watchlist_button=False
-            )
+        await query.edit_message_text(
+            message_loader.get_add_help_message(), parse_mode=ParseMode.MARKDOWN
+        )
 
-            await query.edit_message_text(
-                results_message,
-                parse_mode=ParseMode.MARKDOWN,
-                reply_markup=reply_markup,
-            )
+    async def _on_clear_watchlist(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        """Ask for confirmation before clearing the watchlist"""
+        query = update.callback_query
+        user = update.effective_user
 
-        elif data == "show_watchlist":
-            # Use helper method to get watchlist display
-            keywords, message, reply_markup, error = await self._get_watchlist_display(
-                user_id=user.id, include_tips=False, include_buttons=False
+        # Check if user has any watchlist items
+        try:
+            current_keywords = await asyncio.to_thread(
+                self.db.get_user_watchlist, user.id
             )
+        except Exception as e:
+            logger.error(f"Error getting watchlist for user {user.id}: {e}")
+            await query.edit_message_text(
+                "❌ Sorry, there was an error accessing your watchlist. Please try again later."
+            )
+            return
 
-            if error:
-                # Error occurred, show error message
-                await query.edit_message_text(message)
-            else:
-                await query.edit_message_text(message, parse_mode=ParseMode.MARKDOWN)
-
-        elif data == "show_add_help":
+        if not current_keywords:
             await query.edit_message_text(
-                message_loader.get_add_help_message(), parse_mode=ParseMode.MARKDOWN
+                "📭 Your watchlist is already empty!\n\nUse `/add <keyword>` to add items to watch.",
+                parse_mode=ParseMode.MARKDOWN,
             )
+            return
 
-        elif data == "clear_watchlist":
-            # Check if user has any watchlist items
-            try:
-                current_keywords = self.db.get_user_watchlist(user.id)
-            except Exception as e:
-                logger.error(f"Error getting watchlist for user {user.id}: {e}")
-                await query.edit_message_text(
-                    "❌ Sorry, there was an error accessing your watchlist. Please try again later."
-                )
-                return
+        # Show confirmation with inline buttons
+        message, reply_markup = self._build_clear_confirmation(current_keywords)
 
-            if not current_keywords:
-                await query.edit_message_text(
-                    "📭 Your watchlist is already empty!\n\nUse `/add <keyword>` to add items to watch.",
-                    parse_mode=ParseMode.MARKDOWN,
-                )
-                return
+        await query.edit_message_text(
+            message, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup
+        )
 
-            # Show confirmation with inline buttons
-            keyboard = [
-                [
-                    InlineKeyboardButton(
-                        "✅ Yes, clear all", callback_data="confirm_clear_watchlist"
-                    ),
-                    InlineKeyboardButton(
-                        "❌ Cancel", callback_data="cancel_clear_watchlist"
-                    ),
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+    async def _on_confirm_clear(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        """Clear the watchlist after confirmation"""
+        query = update.callback_query
+        user = update.effective_user
 
-            message = (
-                f"⚠️ **Clear Watchlist Confirmation**\n\n"
-                f"Are you sure you want to clear your entire watchlist?\n\n"
-                f"This will remove **{len(current_keywords)} item{'s' if len(current_keywords) != 1 else ''}**:\n"
-                f"• {', '.join(current_keywords)}\n\n"
-                f"This action cannot be undone."
+        # Actually clear the watchlist
+        try:
+            cleared_count = await asyncio.to_thread(
+                self.db.clear_user_watchlist, user.id
             )
-
+        except Exception as e:
+            logger.error(f"Error clearing watchlist for user {user.id}: {e}")
             await query.edit_message_text(
-                message, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup
+                "❌ Sorry, there was an error clearing your watchlist. Please try again later."
             )
+            return
 
-        elif data == "confirm_clear_watchlist":
-            # Actually clear the watchlist
-            try:
-                cleared_count = self.db.clear_user_watchlist(user.id)
-            except Exception as e:
-                logger.error(f"Error clearing watchlist for user {user.id}: {e}")
-                await query.edit_message_text(
-                    "❌ Sorry, there was an error clearing your watchlist. Please try again later."
-                )
-                return
+        if cleared_count > 0:
+            message = (
+                f"✅ **Watchlist Cleared Successfully**\n\n"
+                f"Removed **{cleared_count} item{'s' if cleared_count != 1 else ''}** from your watchlist.\n\n"
+                f"Use `/add <keyword>` to start building your watchlist again!"
+            )
+        else:
+            message = "📭 Your watchlist was already empty!"
 
-            if cleared_count > 0:
-                message = (
-                    f"✅ **Watchlist Cleared Successfully**\n\n"
-                    f"Removed **{cleared_count} item{'s' if cleared_count != 1 else ''}** from your watchlist.\n\n"
-                    f"Use `/add <keyword>` to start building your watchlist again!"
-                )
-            else:
-                message = "📭 Your watchlist was already empty!"
+        await query.edit_message_text(message, parse_mode=ParseMode.MARKDOWN)
 
-            await query.edit_message_text(message, parse_mode=ParseMode.MARKDOWN)
+    async def _on_cancel_clear(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        """Cancel clearing and show the watchlist again"""
+        query = update.callback_query
+        user = update.effective_user
 
-        elif data == "cancel_clear_watchlist":
-            # User cancelled, show watchlist again
-            keywords, message, reply_markup, error = await self._get_watchlist_display(
-                user_id=user.id, include_tips=False, include_buttons=True
-            )
+        # User cancelled, show watchlist again
+        keywords, message, reply_markup, error = await self._get_watchlist_display(
+            user_id=user.id, include_tips=False, include_buttons=True
+        )
 
-            if error:
-                await query.edit_message_text(message)
-            else:
-                await query.edit_message_text(
-                    message, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup
-                )
+        if error:
+            await query.edit_message_text(message)
+        else:
+            await query.edit_message_text(
+                message, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup
+            )
 
     async def handle_text_message(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -487,7 +577,7 @@ class WakeABCBot:
         text = update.message.text.strip()
 
         # Simple responses for common queries
-        if any(word in text.lower() for word in ["help", "how", "what"]):
+        if _TRIGGER_RE.search(text):
             await update.message.reply_text(
                 "ℹ️ Type `/help` to see all available commands!",
                 parse_mode=ParseMode.MARKDOWN,
@@ -525,8 +615,22 @@ class WakeABCBot:
         app.add_handler(CommandHandler("remove", self.remove_command))
         app.add_handler(CommandHandler("clear", self.clear_command))
 
-        # Callback query handler for inline buttons
-        app.add_handler(CallbackQueryHandler(self.button_callback))
+        # Inline button callbacks: acknowledge first (group -1), then dispatch by
+        # callback_data pattern. The work handlers don't block the update queue.
+        app.add_handler(CallbackQueryHandler(self.answer_callback), group=-1)
+        callback_handlers = [
+            (self._on_add_watch, r"^add_watch:"),
+            (self._on_search, r"^search:"),
+            (self._on_show_watchlist, r"^show_watchlist$"),
+            (self._on_show_add_help, r"^show_add_help$"),
+            (self._on_clear_watchlist, r"^clear_watchlist$"),
+            (self._on_confirm_clear, r"^confirm_clear_watchlist$"),
+            (self._on_cancel_clear, r"^cancel_clear_watchlist$"),
+        ]
+        for callback, pattern in callback_handlers:
+            app.add_handler(
+                CallbackQueryHandler(callback, pattern=pattern, block=False)
+            )
 
         # Text message handler (for non-command messages)
         app.add_handler(
@@ -548,6 +652,7 @@ class WakeABCBot:
             .get_updates_write_timeout(10)
             .get_updates_connect_timeout(10)
             .get_updates_pool_timeout(10)
+            .rate_limiter(self.rate_limiter)
             .build()
         )
 
@@ -560,19 +665,36 @@ class WakeABCBot:
         await self.application.initialize()
         await self.application.start()
 
-        # Start polling
-        await self.application.updater.start_polling(
-            poll_interval=1.0,
-            timeout=10,
-            bootstrap_retries=-1,
-        )
+        if Config.BOT_MODE == "webhook":
+            # Let Telegram push updates to us instead of polling for them
+            await self.application.updater.start_webhook(
+                listen=Config.WEBHOOK_LISTEN,
+                port=Config.WEBHOOK_PORT,
+                url_path=Config.WEBHOOK_PATH,
+                secret_token=Config.WEBHOOK_SECRET_TOKEN,
+                webhook_url=Config.WEBHOOK_URL,
+                bootstrap_retries=-1,
+            )
 
-        logger.info("Bot is now polling for updates...")
+            logger.info(
+                f"Bot is now listening for webhook updates on "
+                f"{Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}..."
+            )
+        else:
+            # Start polling
+            await self.application.updater.start_polling(
+                poll_interval=1.0,
+                timeout=10,
+                bootstrap_retries=-1,
+            )
 
-        # Keep running until cancelled
+            logger.info("Bot is now polling for updates...")
+
+        # Keep running until cancelled; nothing sets this event, so the task
+        # stays parked without waking the event loop
+        self._stop_event = asyncio.Event()
         try:
-            while True:
-                await asyncio.sleep(1)
+            await self._stop_event.wait()
         except asyncio.CancelledError:
             logger.info("Bot polling cancelled")
             raise
@@ -598,13 +720,17 @@ class WakeABCBot:
                 except Exception as e:
                     logger.error(f"Error during bot shutdown: {e}")
 
+            if self._owns_scraper:
+                await self.scraper.aclose()
+            self.db.close()
+
 
 def main():
     """Main function"""
     bot = WakeABCBot()
 
     try:
-        asyncio.run(bot.run_bot())
+        run_async(bot.run_bot())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
@@ -5,6 +5,7 @@ Configuration module for Wake ABC Telegram Bot
 import logging
 import os
 import re
+from typing import Optional
 
 from dotenv import load_dotenv
 
@@ -12,23 +13,32 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+# Redaction patterns, compiled once since they run for every log record
+_TOKEN_URL_RE = re.compile(r"(api\.telegram\.org/bot)[^/\s]+")
+_AUTH_BEARER_RE = re.compile(r"(Authorization:\s*Bearer\s+)[^\s]+")
+_BEARER_RE = re.compile(r"(Bearer\s+)[A-Za-z0-9:_-]+")
+# A bot token anywhere in the text, whatever precedes it (bot123456:..., the
+# token `123456:...`, TOKEN='123456:...', a bare token)
+_BOT_TOKEN_RE = re.compile(r"(?<!\d)\d{8,}:[A-Za-z0-9_-]{20,}(?![A-Za-z0-9_-])")
+
+# Shape of a Telegram bot token: numeric bot ID, colon, secret
+_TOKEN_FORMAT_RE = re.compile(r"\d+:[A-Za-z0-9_-]+")
+
+
 def _redact_sensitive_info(message):
     # Redact bot tokens from URLs
     if "api.telegram.org/bot" in message:
         # Replace the token part with [REDACTED]
-        message = re.sub(r"(api\.telegram\.org/bot)[^/\s]+", r"\1[REDACTED]", message)
+        message = _TOKEN_URL_RE.sub(r"\1[REDACTED]", message)
 
     # Redact any Bearer tokens or Authorization headers
     if "Authorization:" in message or "Bearer " in message:
-        message = re.sub(
-            r"(Authorization:\s*Bearer\s+)[^\s]+", r"\1[REDACTED]", message
-        )
-        message = re.sub(r"(Bearer\s+)[A-Za-z0-9:_-]+", r"\1[REDACTED]", message)
+        message = _AUTH_BEARER_RE.sub(r"\1[REDACTED]", message)
+        message = _BEARER_RE.sub(r"\1[REDACTED]", message)
 
-    # Redact any tokens that look like bot tokens (long alphanumeric strings)
-    if len(message) > 20:  # Only check longer messages
-        # Look for patterns like bot123456:ABC-DEF...
-        message = re.sub(r"\b\d{8,}:[A-Za-z0-9_-]{20,}\b", "[REDACTED_TOKEN]", message)
+    # Redact anything that looks like a bot token; every token has a colon
+    if ":" in message:
+        message = _BOT_TOKEN_RE.sub("[REDACTED_TOKEN]", message)
 
     return message
 
@@ -36,16 +46,29 @@ def _redact_sensitive_info(message):
 class SensitiveInfoFilter(logging.Filter):
     """Filter to remove or redact sensitive information from logs"""
 
+    # Lowercased substrings that must be present for _redact_sensitive_info
+    # to change anything (a bare token has no "bot"/"token" around it, but
+    # always has a colon)
+    _SENTINELS = ("bot", "token", ":", "bearer ")
+
     def filter(self, record):
         # Get the formatted message - this is what actually gets logged
         try:
             message = record.getMessage()
         except Exception:
             # Fallback to record.msg if getMessage() fails
-            message = str(getattr(record, "msg", ""))
+            record.msg = _redact_sensitive_info(str(getattr(record, "msg", "")))
+            record.args = ()
+            return True
+
+        lowered = message.lower()
+        if not any(sentinel in lowered for sentinel in self._SENTINELS):
+            return True
 
-        record.msg = _redact_sensitive_info(message)
-        record.args = ()
+        redacted = _redact_sensitive_info(message)
+        if redacted != message:
+            record.msg = redacted
+            record.args = ()
 
         return True
 
@@ -56,28 +79,75 @@ class Config:
     # Telegram Bot Configuration
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+    # Token values that mean no real token was configured (unset, empty, or
+    # the env.example placeholder)
+    TOKEN_PLACEHOLDERS = frozenset({None, "", "your_bot_token_here"})
+
+    # Update delivery: "polling" (default) or "webhook"
+    BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+    # Webhook Configuration (only used when BOT_MODE=webhook)
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "")
+    WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN") or None
+
     # Database Configuration
     DATABASE_PATH = os.getenv("DATABASE_PATH", "wakeabc_bot.db")
 
     # Monitoring Configuration
     CHECK_INTERVAL_MINUTES = int(os.getenv("CHECK_INTERVAL_MINUTES", "30"))
 
-    # Wake ABC Site Configuration
-    WAKE_ABC_SEARCH_URL = os.getenv(
-        "WAKE_ABC_SEARCH_URL", "https://wakeabc.com/search-our-inventory/"
-    )
+    # How many watchlist keywords are searched at once, and how long each
+    # search slot waits before the next search, to go easy on the site
+    MAX_CONCURRENT_SEARCHES = int(os.getenv("MAX_CONCURRENT_SEARCHES", "4"))
+    SEARCH_DELAY_SECONDS = float(os.getenv("SEARCH_DELAY_SECONDS", "2"))
+
+    # How long search results are reused for repeated searches of a query
+    SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
 
     # Logging Configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+    @classmethod
+    def is_valid_token(cls, token: Optional[str]) -> bool:
+        """Check whether token is a real, well-formed bot token"""
+        return (
+            token not in cls.TOKEN_PLACEHOLDERS
+            and _TOKEN_FORMAT_RE.fullmatch(token) is not None
+        )
+
+    @classmethod
+    def has_valid_token(cls) -> bool:
+        """Check whether a real bot token is configured"""
+        return cls.is_valid_token(cls.TELEGRAM_BOT_TOKEN)
+
     @classmethod
     def validate_config(cls):
         """Validate that required configuration is present"""
-        if not cls.TELEGRAM_BOT_TOKEN:
+        if cls.TELEGRAM_BOT_TOKEN in cls.TOKEN_PLACEHOLDERS:
             raise ValueError(
                 "TELEGRAM_BOT_TOKEN is required. Please set it in your .env file."
             )
 
+        if not cls.has_valid_token():
+            raise ValueError(
+                "TELEGRAM_BOT_TOKEN does not look like a bot token. It should be "
+                "the <bot id>:<secret> token given by @BotFather."
+            )
+
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(
+                f"Invalid BOT_MODE '{cls.BOT_MODE}'. Use 'polling' or 'webhook'."
+            )
+
+        if cls.BOT_MODE == "webhook" and not cls.WEBHOOK_URL:
+            raise ValueError(
+                "WEBHOOK_URL is required when BOT_MODE=webhook. Please set it to "
+                "the public HTTPS URL Telegram should deliver updates to."
+            )
+
         return True
 
     @classmethod
@@ -93,24 +163,10 @@ class Config:
             handlers=[logging.StreamHandler()],
         )
 
-        # Apply the filter to multiple loggers to catch HTTP library logs
+        # Apply the filter to the root handlers so every record that gets
+        # emitted, whichever logger it came from, is redacted exactly once
         sensitive_filter = SensitiveInfoFilter()
-
-        # Apply to specific HTTP libraries that might log sensitive info
-        http_loggers = [
-            "urllib3",
-            "urllib3.connectionpool",
-            "requests",
-            "requests.packages.urllib3",
-            "httpx",
-            "aiohttp",
-            "telegram",
-            "telegram.ext",
-            "httpcore",
-        ]
-
-        for logger_name in http_loggers:
-            logger = logging.getLogger(logger_name)
-            logger.addFilter(sensitive_filter)
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(sensitive_filter)
 
         return True
@@ -6,13 +6,262 @@ Handles SQLite database operations for storing user watchlists and preferences
 import json
 import logging
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from typing import Any, Dict, List, Optional, Tuple
 
 from .config import Config
 from .inventory_scraper import InventoryItem
+from .utils import format_price_cents
 
 logger = logging.getLogger(__name__)
 
+# Applied to every connection. WAL lets the bot read while the monitor writes,
+# and synchronous=NORMAL is safe under WAL without an fsync on every commit.
+# WAL needs shared memory between processes, so DATABASE_PATH must be on a
+# local filesystem (not NFS/SMB).
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Schema migrations for databases created by older versions. Entry N upgrades
+# a database from PRAGMA user_version N to N + 1.
+_MIGRATIONS = (
+    # 1: match watchlist keywords case-insensitively through the column collation
+    """
+    CREATE TABLE watchlist_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        keyword TEXT NOT NULL COLLATE NOCASE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+    INSERT INTO watchlist_new (id, user_id, keyword, created_at, is_active)
+    SELECT id, user_id, keyword, created_at, is_active FROM watchlist;
+    DROP TABLE watchlist;
+    ALTER TABLE watchlist_new RENAME TO watchlist;
+    """,
+    # 2: one active row per user and keyword, enforced by ux_watch_user_kw_active
+    """
+    UPDATE watchlist SET is_active = 0
+    WHERE is_active = 1 AND id NOT IN (
+        SELECT MIN(id) FROM watchlist WHERE is_active = 1 GROUP BY user_id, keyword
+    );
+    DROP INDEX IF EXISTS idx_watch_user_kw;
+    """,
+    # 3: key item_snapshots by its natural key instead of a rowid plus a UNIQUE index
+    """
+    CREATE TABLE item_snapshots_new (
+        user_id INTEGER,
+        keyword TEXT,
+        product_name TEXT,
+        product_code TEXT,
+        price TEXT,
+        availability TEXT,
+        total_stock INTEGER DEFAULT 0,
+        store_locations TEXT,
+        snapshot_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        PRIMARY KEY (user_id, keyword, product_name, product_code)
+    ) WITHOUT ROWID;
+    INSERT OR REPLACE INTO item_snapshots_new (
+        user_id, keyword, product_name, product_code, price, availability,
+        total_stock, store_locations, snapshot_at
+    )
+    SELECT user_id, keyword, product_name, COALESCE(product_code, ''), price,
+        availability, total_stock, store_locations, snapshot_at
+    FROM item_snapshots
+    WHERE user_id IS NOT NULL AND keyword IS NOT NULL AND product_name IS NOT NULL
+    ORDER BY id;
+    DROP TABLE item_snapshots;
+    ALTER TABLE item_snapshots_new RENAME TO item_snapshots;
+    """,
+    # 4: store notified_at as Unix epoch seconds instead of datetime text
+    """
+    CREATE TABLE notifications_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        keyword TEXT,
+        product_name TEXT,
+        product_code TEXT,
+        notified_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+    INSERT INTO notifications_new (
+        id, user_id, keyword, product_name, product_code, notified_at
+    )
+    SELECT id, user_id, keyword, product_name, product_code,
+        CAST(strftime('%s', notified_at) AS INTEGER)
+    FROM notifications;
+    DROP TABLE notifications;
+    ALTER TABLE notifications_new RENAME TO notifications;
+    """,
+    # 5: store snapshot prices as integer cents
+    """
+    CREATE TABLE item_snapshots_new (
+        user_id INTEGER,
+        keyword TEXT,
+        product_name TEXT,
+        product_code TEXT,
+        price_cents INTEGER,
+        availability TEXT,
+        total_stock INTEGER DEFAULT 0,
+        store_locations TEXT,
+        snapshot_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        PRIMARY KEY (user_id, keyword, product_name, product_code)
+    ) WITHOUT ROWID;
+    INSERT INTO item_snapshots_new (
+        user_id, keyword, product_name, product_code, price_cents, availability,
+        total_stock, store_locations, snapshot_at
+    )
+    SELECT user_id, keyword, product_name, product_code,
+        CASE
+            WHEN REPLACE(REPLACE(price, '$', ''), ',', '') GLOB '[0-9]*'
+                AND REPLACE(REPLACE(price, '$', ''), ',', '') NOT GLOB '*[^0-9.]*'
+            THEN CAST(ROUND(CAST(REPLACE(REPLACE(price, '$', ''), ',', '') AS REAL) * 100) AS INTEGER)
+        END,
+        availability, total_stock, store_locations, snapshot_at
+    FROM item_snapshots;
+    DROP TABLE item_snapshots;
+    ALTER TABLE item_snapshots_new RENAME TO item_snapshots;
+    """,
+    # 6: hash of store_locations so unchanged rows skip the JSON decode
+    """
+    ALTER TABLE item_snapshots ADD COLUMN locations_hash INTEGER;
+    """,
+    # 7: store_locations as newline-separated text instead of a JSON array
+    """
+    UPDATE item_snapshots
+    SET store_locations = COALESCE(
+        (SELECT group_concat(value, char(10)) FROM json_each(store_locations)), ''
+    )
+    WHERE store_locations LIKE '[%';
+    """,
+    # 8: fold the watchlist indexes into ux_watch_user_kw_active, recreated by
+    # init_database with is_active as a column so it also covers keyword reads
+    """
+    DROP INDEX IF EXISTS idx_watch_active;
+    DROP INDEX IF EXISTS idx_watch_covering;
+    DROP INDEX IF EXISTS ux_watch_user_kw_active;
+    """,
+)
+
+# Statements run by the bot and the monitor. sqlite3 caches compiled statements
+# per connection keyed by the SQL text, so keeping them as constants on a
+# long-lived connection means they are only prepared once.
+_SQL_ADD_USER = """
+    INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
+    VALUES (?, ?, ?, ?)
+"""
+_SQL_INSERT_WATCHLIST_KEYWORD = """
+    INSERT INTO watchlist (user_id, keyword)
+    SELECT ?, ?
+    WHERE NOT EXISTS (
+        SELECT 1 FROM watchlist WHERE user_id = ? AND keyword = ? AND is_active = 1
+    )
+"""
+_SQL_REMOVE_WATCHLIST_KEYWORD = """
+    UPDATE watchlist
+    SET is_active = 0
+    WHERE user_id = ? AND keyword = ? AND is_active = 1
+"""
+_SQL_CLEAR_WATCHLIST = """
+    UPDATE watchlist
+    SET is_active = 0
+    WHERE user_id = ? AND is_active = 1
+"""
+_SQL_GET_WATCHLIST = """
+    SELECT keyword FROM watchlist
+    WHERE user_id = ? AND is_active = 1
+    ORDER BY created_at
+"""
+_SQL_GET_ALL_WATCHLIST_KEYWORDS = """
+    SELECT DISTINCT user_id, keyword FROM watchlist
+    WHERE is_active = 1
+"""
+# Grouped by exact spelling: the column's NOCASE collation would merge users'
+# differently capitalized keywords, while snapshots and notifications are
+# keyed by the spelling each user saved
+_SQL_GET_WATCHLIST_GROUPED_BY_KEYWORD = """
+    SELECT keyword, GROUP_CONCAT(DISTINCT user_id) FROM watchlist
+    WHERE is_active = 1
+    GROUP BY keyword COLLATE BINARY
+"""
+_SQL_ADD_NOTIFICATION = """
+    INSERT INTO notifications (user_id, keyword, product_name, product_code, notified_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+_SQL_PRUNE_NOTIFICATIONS = """
+    DELETE FROM notifications WHERE notified_at < ?
+"""
+_SQL_WAS_RECENTLY_NOTIFIED = """
+    SELECT 1 FROM notifications
+    WHERE user_id = ? AND keyword = ? AND product_name = ? AND notified_at > ?
+    LIMIT 1
+"""
+_SQL_GET_ACTIVE_USERS = """
+    SELECT DISTINCT user_id FROM users
+    WHERE is_active = 1
+"""
+_SQL_GET_SNAPSHOT = """
+    SELECT product_name, product_code, price_cents, availability, total_stock,
+        store_locations, snapshot_at, locations_hash
+    FROM item_snapshots
+    WHERE user_id = ? AND keyword = ? AND product_name = ? AND product_code = ?
+"""
+_SQL_GET_SNAPSHOTS_FOR_KEYWORD = """
+    SELECT product_name, product_code, price_cents, availability, total_stock,
+        store_locations, snapshot_at, locations_hash
+    FROM item_snapshots
+    WHERE user_id = ? AND keyword = ?
+"""
+_SQL_GET_SNAPSHOTS_FOR_USERS = """
+    SELECT user_id, product_name, product_code, price_cents, availability,
+        total_stock, store_locations, snapshot_at, locations_hash
+    FROM item_snapshots
+    WHERE user_id IN (SELECT value FROM json_each(?)) AND keyword = ?
+"""
+_SQL_SAVE_SNAPSHOT = """
+    INSERT INTO item_snapshots
+    (user_id, keyword, product_name, product_code, price_cents, availability, total_stock, store_locations,
+     locations_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, keyword, product_name, product_code) DO UPDATE SET
+        price_cents = excluded.price_cents,
+        availability = excluded.availability,
+        total_stock = excluded.total_stock,
+        store_locations = excluded.store_locations,
+        locations_hash = excluded.locations_hash,
+        snapshot_at = CURRENT_TIMESTAMP
+    -- Leave unchanged rows alone so they cost no write
+    WHERE price_cents IS NOT excluded.price_cents
+        OR availability IS NOT excluded.availability
+        OR total_stock IS NOT excluded.total_stock
+        OR locations_hash IS NOT excluded.locations_hash
+"""
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open the connection a Database uses for its whole lifetime"""
+    # One connection for the lifetime of the Database so SQLite's page and
+    # statement caches stay warm. It is shared by the worker threads the bot
+    # runs queries on, so access is serialized with a lock. With
+    # isolation_level=None each statement commits on its own unless it runs
+    # inside transaction().
+    return sqlite3.connect(
+        db_path,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=256,
+    )
+
 
 class Database:
     """Database handler for the Wake ABC bot"""
@@ -20,14 +269,92 @@ class Database:
     def __init__(self, db_path: str = None):
         """Initialize database connection"""
         self.db_path = db_path or Config.DATABASE_PATH
+
+        self._attach(_connect(self.db_path))
         self.init_database()
 
+    @classmethod
+    def from_connection(
+        cls, conn: sqlite3.Connection, db_path: str = ":memory:"
+    ) -> "Database":
+        """Wrap an open connection to a database that already has the schema"""
+        db = cls.__new__(cls)
+        db.db_path = db_path
+        conn.isolation_level = None
+        db._attach(conn)
+        return db
+
+    def copy(self) -> "Database":
+        """Return an in-memory copy of this database, schema and data included"""
+        conn = _connect(":memory:")
+        with self._connection() as source:
+            source.backup(conn)
+        return Database.from_connection(conn)
+
+    def _attach(self, conn: sqlite3.Connection):
+        """Take ownership of conn and set up the state kept alongside it"""
+        self._conn = conn
+        for pragma in _CONNECTION_PRAGMAS:
+            self._conn.execute(pragma)
+        self._lock = threading.RLock()
+
+        # get_all_watchlist_keywords/get_watchlist_grouped_by_keyword/
+        # get_active_users results, reused until the users or watchlist tables
+        # change (see _watch_cache_key)
+        self._watch_version = 0
+        self._watch_cache = None
+        self._grouped_watch_cache = None
+        self._users_cache = None
+
+    def _watch_cache_key(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        """Identify the current state of the users and watchlist tables"""
+        # _watch_version covers writes made through this object; data_version
+        # changes whenever another connection (e.g. the bot's, when this is
+        # the monitor's) commits anything
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        return self._watch_version, data_version
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _connection(self):
+        """Lock the shared connection for the duration of the block"""
+        with self._lock:
+            yield self._conn
+
+    @contextmanager
+    def transaction(self):
+        """Run every write in the block in a single transaction (one commit)"""
+        with self._lock:
+            conn = self._conn
+            if conn.in_transaction:
+                # Nested use joins the outer transaction
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
     def init_database(self):
         """Initialize database tables"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
 
+                # Databases created by older versions are upgraded below
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'watchlist'"
+                )
+                is_new = cursor.fetchone() is None
+
                 # Create users table
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS users (
@@ -45,7 +372,7 @@ class Database:
                     CREATE TABLE IF NOT EXISTS watchlist (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         user_id INTEGER,
-                        keyword TEXT NOT NULL,
+                        keyword TEXT NOT NULL COLLATE NOCASE,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         is_active BOOLEAN DEFAULT 1,
                         FOREIGN KEY (user_id) REFERENCES users (user_id)
@@ -60,7 +387,7 @@ class Database:
                         keyword TEXT,
                         product_name TEXT,
                         product_code TEXT,
-                        notified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        notified_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
                         FOREIGN KEY (user_id) REFERENCES users (user_id)
                     )
                 """)
@@ -68,27 +395,60 @@ class Database:
                 # Create item_snapshots table to track detailed item state for change detection
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS item_snapshots (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
                         user_id INTEGER,
                         keyword TEXT,
                         product_name TEXT,
                         product_code TEXT,
-                        price TEXT,
+                        price_cents INTEGER,
                         availability TEXT,
                         total_stock INTEGER DEFAULT 0,
                         store_locations TEXT,
                         snapshot_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        locations_hash INTEGER,
                         FOREIGN KEY (user_id) REFERENCES users (user_id),
-                        UNIQUE(user_id, keyword, product_name, product_code)
-                    )
+                        PRIMARY KEY (user_id, keyword, product_name, product_code)
+                    ) WITHOUT ROWID
+                """)
+
+                if is_new:
+                    # Fresh databases are created in the latest shape
+                    cursor.execute(f"PRAGMA user_version = {len(_MIGRATIONS)}")
+                else:
+                    self._migrate(conn)
+
+                # Indexes for the lookups done on every command and poll. The
+                # item_snapshots primary key already covers snapshot lookups,
+                # so it doesn't need a separate index.
+                # One active row per user and keyword. is_active is a column so
+                # SQLite treats the index as covering and get_all_watchlist_keywords
+                # reads only the index; user_id lookups use its prefix.
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS ux_watch_user_kw_active
+                    ON watchlist (user_id, keyword, is_active) WHERE is_active = 1
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_notif_age
+                    ON notifications (notified_at)
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_notif_recent
+                    ON notifications (user_id, keyword, product_name, notified_at)
                 """)
 
-                conn.commit()
                 logger.info("Database initialized successfully")
         except sqlite3.Error as e:
             logger.error(f"Database initialization error: {e}")
             raise
 
+    def _migrate(self, conn: sqlite3.Connection):
+        """Bring an existing database up to the latest schema version"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            logger.info(f"Migrating database to schema version {target}")
+            conn.executescript(
+                f"BEGIN; {script} PRAGMA user_version = {target}; COMMIT;"
+            )
+
     def add_user(
         self,
         user_id: int,
@@ -98,16 +458,12 @@ class Database:
     ):
         """Add or update a user in the database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
-                    VALUES (?, ?, ?, ?)
-                """,
-                    (user_id, username, first_name, last_name),
+                    _SQL_ADD_USER, (user_id, username, first_name, last_name)
                 )
-                conn.commit()
+                self._watch_version += 1
                 logger.info(f"User {user_id} added/updated in database")
         except sqlite3.Error as e:
             logger.error(f"Error adding user {user_id}: {e}")
@@ -116,30 +472,17 @@ class Database:
     def add_watchlist_keyword(self, user_id: int, keyword: str) -> bool:
         """Add a keyword to user's watchlist"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
 
-                # Check if keyword already exists for this user
+                # Add the keyword unless it is already on the user's watchlist
                 cursor.execute(
-                    """
-                    SELECT id FROM watchlist
-                    WHERE user_id = ? AND LOWER(keyword) = LOWER(?) AND is_active = 1
-                """,
-                    (user_id, keyword),
+                    _SQL_INSERT_WATCHLIST_KEYWORD, (user_id, keyword, user_id, keyword)
                 )
-
-                if cursor.fetchone():
+                if cursor.rowcount != 1:
                     return False  # Keyword already exists
 
-                # Add new keyword
-                cursor.execute(
-                    """
-                    INSERT INTO watchlist (user_id, keyword)
-                    VALUES (?, ?)
-                """,
-                    (user_id, keyword),
-                )
-                conn.commit()
+                self._watch_version += 1
                 logger.info(
                     f"Added keyword '{keyword}' to watchlist for user {user_id}"
                 )
@@ -151,19 +494,12 @@ class Database:
     def remove_watchlist_keyword(self, user_id: int, keyword: str) -> bool:
         """Remove a keyword from user's watchlist"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE watchlist
-                    SET is_active = 0
-                    WHERE user_id = ? AND LOWER(keyword) = LOWER(?) AND is_active = 1
-                """,
-                    (user_id, keyword),
-                )
+                cursor.execute(_SQL_REMOVE_WATCHLIST_KEYWORD, (user_id, keyword))
 
                 if cursor.rowcount > 0:
-                    conn.commit()
+                    self._watch_version += 1
                     logger.info(
                         f"Removed keyword '{keyword}' from watchlist for user {user_id}"
                     )
@@ -176,20 +512,13 @@ class Database:
     def clear_user_watchlist(self, user_id: int) -> int:
         """Clear all keywords from user's watchlist. Returns number of items cleared."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE watchlist
-                    SET is_active = 0
-                    WHERE user_id = ? AND is_active = 1
-                """,
-                    (user_id,),
-                )
+                cursor.execute(_SQL_CLEAR_WATCHLIST, (user_id,))
 
                 cleared_count = cursor.rowcount
                 if cleared_count > 0:
-                    conn.commit()
+                    self._watch_version += 1
                     logger.info(
                         f"Cleared {cleared_count} keywords from watchlist for user {user_id}"
                     )
@@ -201,16 +530,9 @@ class Database:
     def get_user_watchlist(self, user_id: int) -> List[str]:
         """Get all active watchlist keywords for a user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    SELECT keyword FROM watchlist
-                    WHERE user_id = ? AND is_active = 1
-                    ORDER BY created_at
-                """,
-                    (user_id,),
-                )
+                cursor.execute(_SQL_GET_WATCHLIST, (user_id,))
 
                 return [row[0] for row in cursor.fetchall()]
         except sqlite3.Error as e:
@@ -220,33 +542,55 @@ class Database:
     def get_all_watchlist_keywords(self) -> List[Tuple[int, str]]:
         """Get all active watchlist keywords from all users"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT DISTINCT user_id, keyword FROM watchlist
-                    WHERE is_active = 1
-                """)
-
-                return cursor.fetchall()
+                key = self._watch_cache_key(conn)
+                if self._watch_cache is not None and self._watch_cache[0] == key:
+                    return list(self._watch_cache[1])
+
+                cursor.execute(_SQL_GET_ALL_WATCHLIST_KEYWORDS)
+                rows = cursor.fetchall()
+                self._watch_cache = (key, rows)
+                return list(rows)
         except sqlite3.Error as e:
             logger.error(f"Error getting all watchlist keywords: {e}")
             raise
 
+    def get_watchlist_grouped_by_keyword(self) -> Dict[str, List[int]]:
+        """Get the users watching each active keyword"""
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                key = self._watch_cache_key(conn)
+                if (
+                    self._grouped_watch_cache is not None
+                    and self._grouped_watch_cache[0] == key
+                ):
+                    grouped = self._grouped_watch_cache[1]
+                else:
+                    cursor.execute(_SQL_GET_WATCHLIST_GROUPED_BY_KEYWORD)
+                    grouped = {
+                        keyword: [int(user_id) for user_id in user_ids.split(",")]
+                        for keyword, user_ids in cursor.fetchall()
+                    }
+                    self._grouped_watch_cache = (key, grouped)
+
+                return {keyword: list(users) for keyword, users in grouped.items()}
+        except sqlite3.Error as e:
+            logger.error(f"Error getting watchlist grouped by keyword: {e}")
+            raise
+
     def add_notification(
         self, user_id: int, keyword: str, product_name: str, product_code: str = None
     ):
         """Record that we've notified a user about a product"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    """
-                    INSERT INTO notifications (user_id, keyword, product_name, product_code)
-                    VALUES (?, ?, ?, ?)
-                """,
-                    (user_id, keyword, product_name, product_code),
+                    _SQL_ADD_NOTIFICATION,
+                    (user_id, keyword, product_name, product_code, int(time.time())),
                 )
-                conn.commit()
                 logger.info(
                     f"Recorded notification for user {user_id} about '{product_name}'"
                 )
@@ -254,20 +598,37 @@ class Database:
             logger.error(f"Error recording notification: {e}")
             raise
 
+    def add_notifications_bulk(
+        self, user_id: int, keyword: str, products: List[Tuple[str, Optional[str]]]
+    ):
+        """Record notifications for several (product_name, product_code) pairs at once"""
+        try:
+            now = int(time.time())
+            rows = [
+                (user_id, keyword, product_name, product_code, now)
+                for product_name, product_code in products
+            ]
+
+            with self.transaction() as conn:
+                conn.executemany(_SQL_ADD_NOTIFICATION, rows)
+                logger.info(
+                    f"Recorded {len(rows)} notifications for user {user_id} about '{keyword}'"
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error recording notifications: {e}")
+            raise
+
     def was_recently_notified(
         self, user_id: int, keyword: str, product_name: str, hours: int = 24
     ) -> bool:
         """Check if user was recently notified about this product"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
+                cutoff = int(time.time()) - hours * 3600
                 cursor.execute(
-                    """
-                    SELECT id FROM notifications
-                    WHERE user_id = ? AND keyword = ? AND product_name = ?
-                    AND notified_at > datetime('now', '-{} hours')
-                """.format(hours),
-                    (user_id, keyword, product_name),
+                    _SQL_WAS_RECENTLY_NOTIFIED,
+                    (user_id, keyword, product_name, cutoff),
                 )
 
                 return cursor.fetchone() is not None
@@ -275,112 +636,182 @@ class Database:
             logger.error(f"Error checking notification history: {e}")
             raise
 
+    def prune_notifications(self, max_age_hours: int = 168) -> int:
+        """Delete notification records older than max_age_hours. Returns number deleted."""
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cutoff = int(time.time()) - max_age_hours * 3600
+                cursor.execute(_SQL_PRUNE_NOTIFICATIONS, (cutoff,))
+
+                deleted_count = cursor.rowcount
+                if deleted_count > 0:
+                    logger.info(f"Pruned {deleted_count} old notification records")
+                return deleted_count
+        except sqlite3.Error as e:
+            logger.error(f"Error pruning notifications: {e}")
+            raise
+
     def get_active_users(self) -> List[int]:
         """Get list of all active users"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT DISTINCT user_id FROM users
-                    WHERE is_active = 1
-                """)
-
-                return [row[0] for row in cursor.fetchall()]
+                key = self._watch_cache_key(conn)
+                if self._users_cache is not None and self._users_cache[0] == key:
+                    return list(self._users_cache[1])
+
+                cursor.execute(_SQL_GET_ACTIVE_USERS)
+                user_ids = [row[0] for row in cursor.fetchall()]
+                self._users_cache = (key, user_ids)
+                return list(user_ids)
         except sqlite3.Error as e:
             logger.error(f"Error getting active users: {e}")
             raise
 
+    def _snapshot_row(self, user_id: int, keyword: str, item: InventoryItem) -> tuple:
+        """Build the item_snapshots row values for an item"""
+        # Locations are single-line strings, so newlines can separate them
+        store_locations = "\n".join(item.locations)
+
+        return (
+            user_id,
+            keyword,
+            item.name,
+            item.code or "",
+            item.price_cents,
+            item.availability or "",
+            item.total_stock,
+            store_locations,
+            item.locations_hash,
+        )
+
     def save_item_snapshot(self, user_id: int, keyword: str, item: InventoryItem):
         """Save or update an item snapshot for change detection"""
         try:
-            # Calculate total stock across all locations
-            total_stock = 0
-            for location in item.locations:
-                # Extract stock number from location string
-                parts = location.split(" - ")
-                if len(parts) == 2:
-                    quantity_str = parts[1].lower()
-                    if "in stock" in quantity_str:
-                        import re
-
-                        numbers = re.findall(r"\d+", parts[1])
-                        if numbers:
-                            total_stock += int(numbers[0])
-
-            # Convert locations to JSON for storage
-            store_locations = json.dumps(item.locations)
-
-            with sqlite3.connect(self.db_path) as conn:
+            row = self._snapshot_row(user_id, keyword, item)
+
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO item_snapshots
-                    (user_id, keyword, product_name, product_code, price, availability, total_stock, store_locations)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        user_id,
-                        keyword,
-                        item.name,
-                        item.code or "",
-                        item.price or "",
-                        item.availability or "",
-                        total_stock,
-                        store_locations,
-                    ),
-                )
-                conn.commit()
+                cursor.execute(_SQL_SAVE_SNAPSHOT, row)
                 logger.debug(f"Saved snapshot for user {user_id}: {item.name}")
         except sqlite3.Error as e:
             logger.error(f"Error saving item snapshot: {e}")
             raise
 
+    def save_item_snapshots_bulk(
+        self, user_id: int, keyword: str, items: List[InventoryItem]
+    ):
+        """Save or update snapshots for several items in a single transaction"""
+        try:
+            rows = [self._snapshot_row(user_id, keyword, item) for item in items]
+
+            with self.transaction() as conn:
+                conn.executemany(_SQL_SAVE_SNAPSHOT, rows)
+                logger.debug(f"Saved {len(rows)} snapshots for user {user_id}")
+        except sqlite3.Error as e:
+            logger.error(f"Error saving item snapshots: {e}")
+            raise
+
     def get_previous_item_snapshot(
         self, user_id: int, keyword: str, product_name: str, product_code: str = ""
     ) -> Optional[Dict[str, Any]]:
         """Get the previous snapshot of an item for comparison"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
                 cursor.execute(
-                    """
-                    SELECT product_name, product_code, price, availability, total_stock, store_locations, snapshot_at
-                    FROM item_snapshots
-                    WHERE user_id = ? AND keyword = ? AND product_name = ? AND product_code = ?
-                """,
+                    _SQL_GET_SNAPSHOT,
                     (user_id, keyword, product_name, product_code or ""),
                 )
 
                 row = cursor.fetchone()
                 if row:
-                    return {
-                        "product_name": row[0],
-                        "product_code": row[1],
-                        "price": row[2],
-                        "availability": row[3],
-                        "total_stock": row[4],
-                        "store_locations": json.loads(row[5]) if row[5] else [],
-                        "snapshot_at": row[6],
-                    }
+                    return self._snapshot_from_row(row)
                 return None
         except sqlite3.Error as e:
             logger.error(f"Error getting item snapshot: {e}")
             return None
 
+    def get_snapshots_for_keyword(
+        self, user_id: int, keyword: str
+    ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Get all snapshots for a user's keyword, keyed by (product_name, product_code)"""
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                cursor.execute(_SQL_GET_SNAPSHOTS_FOR_KEYWORD, (user_id, keyword))
+
+                snapshots = {}
+                for row in cursor.fetchall():
+                    snapshot = self._snapshot_from_row(row)
+                    key = (snapshot["product_name"], snapshot["product_code"])
+                    snapshots[key] = snapshot
+                return snapshots
+        except sqlite3.Error as e:
+            logger.error(f"Error getting snapshots for '{keyword}': {e}")
+            raise
+
+    def get_snapshots_for_users(
+        self, user_ids: List[int], keyword: str
+    ) -> Dict[int, Dict[Tuple[str, str], Dict[str, Any]]]:
+        """Get every listed user's snapshots for a keyword, keyed by user_id and then (product_name, product_code)"""
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                # The ids go in as one JSON array so the statement text, and
+                # its cached prepared statement, stay the same for any count
+                cursor.execute(
+                    _SQL_GET_SNAPSHOTS_FOR_USERS, (json.dumps(user_ids), keyword)
+                )
+
+                snapshots = {user_id: {} for user_id in user_ids}
+                for row in cursor.fetchall():
+                    snapshot = self._snapshot_from_row(row)
+                    key = (snapshot["product_name"], snapshot["product_code"])
+                    snapshots[snapshot.pop("user_id")][key] = snapshot
+                return snapshots
+        except sqlite3.Error as e:
+            logger.error(f"Error getting snapshots for '{keyword}': {e}")
+            raise
+
+    def _snapshot_from_row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert an item_snapshots row into a snapshot dict"""
+        # store_locations is split on demand by _snapshot_locations
+        return dict(zip(row.keys(), row))
+
+    @staticmethod
+    def _snapshot_locations(snapshot: Dict[str, Any]) -> List[str]:
+        """Decode the store locations saved in a snapshot"""
+        raw = snapshot["store_locations"]
+        return raw.split("\n") if raw else []
+
     def should_notify_about_item(
-        self, user_id: int, keyword: str, current_item: InventoryItem
+        self,
+        user_id: int,
+        keyword: str,
+        current_item: InventoryItem,
+        snapshots: Optional[Dict[Tuple[str, str], Dict[str, Any]]] = None,
     ) -> Tuple[bool, List[str]]:
         """
         Determine if we should notify about an item based on changes from previous snapshot.
+        Pass snapshots from get_snapshots_for_keyword (or one user's entry from
+        get_snapshots_for_users) to avoid a query per item.
         Returns (should_notify, list_of_reasons)
         """
-        try:
-            previous = self.get_previous_item_snapshot(
-                user_id, keyword, current_item.name, current_item.code or ""
-            )
-        except Exception as e:
-            logger.error(f"Error checking notification conditions: {e}")
-            return False, []
+        if snapshots is not None:
+            previous = snapshots.get((current_item.name, current_item.code or ""))
+        else:
+            try:
+                previous = self.get_previous_item_snapshot(
+                    user_id, keyword, current_item.name, current_item.code or ""
+                )
+            except Exception as e:
+                logger.error(f"Error checking notification conditions: {e}")
+                return False, []
 
         # If no previous snapshot, this is a new item - notify if available
         if not previous:
@@ -393,29 +824,24 @@ class Database:
 
         reasons = []
 
-        # Extract current state
-        current_locations = set(current_item.locations)
-        previous_locations = set(previous["store_locations"])
+        # Same locations as last time means no new stores and the same total
+        # stock, so only the availability and price checks can fire
+        locations_unchanged = previous["locations_hash"] == current_item.locations_hash
 
-        # Calculate current total stock
-        current_total_stock = 0
-        for location in current_item.locations:
-            parts = location.split(" - ")
-            if len(parts) == 2:
-                quantity_str = parts[1].lower()
-                if "in stock" in quantity_str:
-                    import re
-
-                    numbers = re.findall(r"\d+", parts[1])
-                    if numbers:
-                        current_total_stock += int(numbers[0])
+        if locations_unchanged:
+            current_locations = current_item.locations
+            previous_locations = current_item.locations
+        else:
+            current_locations = set(current_item.locations)
+            previous_locations = set(self._snapshot_locations(previous))
 
         # Check notification conditions
 
         # 1. Item is now in stock at a new store
-        new_stores = current_locations - previous_locations
-        if new_stores:
-            reasons.append(f"Now available at {len(new_stores)} new store(s)")
+        if not locations_unchanged:
+            new_stores = current_locations - previous_locations
+            if new_stores:
+                reasons.append(f"Now available at {len(new_stores)} new store(s)")
 
         # 2. Item was completely unavailable but now is available
         was_unavailable = (
@@ -429,30 +855,20 @@ class Database:
             reasons.append("Item is now available (was previously unavailable)")
 
         # 3. Price has dropped
+        previous_cents = previous["price_cents"]
+        current_cents = current_item.price_cents
         if (
-            previous["price"]
-            and current_item.price
-            and previous["price"] != current_item.price
+            previous_cents is not None
+            and current_cents is not None
+            and current_cents < previous_cents
         ):
-            # Simple string comparison for now - could be enhanced with price parsing
-            prev_price_str = previous["price"].replace("$", "").replace(",", "")
-            curr_price_str = current_item.price.replace("$", "").replace(",", "")
-            try:
-                if (
-                    prev_price_str.replace(".", "").isdigit()
-                    and curr_price_str.replace(".", "").isdigit()
-                ):
-                    prev_price = float(prev_price_str)
-                    curr_price = float(curr_price_str)
-                    if curr_price < prev_price:
-                        reasons.append(
-                            f"Price dropped from {previous['price']} to {current_item.price}"
-                        )
-            except ValueError:
-                pass  # Could not parse prices
+            reasons.append(
+                f"Price dropped from {format_price_cents(previous_cents)} to {current_item.price}"
+            )
 
         # 4. Inventory is getting very low (less than 10 items total)
-        if current_total_stock > 0 and current_total_stock < 10:
+        current_total_stock = current_item.total_stock
+        if not locations_unchanged and 0 < current_total_stock < 10:
             if previous["total_stock"] >= 10:
                 reasons.append(
                     f"Low stock alert: Only {current_total_stock} items left"
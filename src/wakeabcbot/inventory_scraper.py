@@ -3,19 +3,129 @@ Inventory scraper module for Wake ABC Telegram Bot
 Handles web scraping and searching of the Wake ABC inventory website
 """
 
+import asyncio
+import html
 import logging
-from dataclasses import dataclass
-from typing import List
-
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cached_property
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, List, Optional, Tuple
+
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 
 from .config import Config
-from .utils import WakeABCCityCache, escape_markdown, extract_city_and_stock
+from .utils import (
+    WakeABCCityCache,
+    escape_markdown,
+    extract_city_and_stock,
+    parse_location_stock,
+    parse_price_cents,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# The search results page has a fixed layout, so every lookup is a fixed
+# CSS selector
+_CSS_RESULTS = "#productSearchResults"
+_CSS_NAME = "h4"
+_CSS_PLU = "small"
+_CSS_PRICE = "span.price"
+_CSS_SIZE = "span.size"
+_CSS_OUT_OF_STOCK = "p.out-of-stock"
+_CSS_INVENTORY = "div.inventory-collapse"
+_CSS_LOCATION_ITEMS = "li"
+_CSS_ADDRESS = "span.address"
+_CSS_QUANTITY = "span.quantity"
+# Product containers are found by walking the tree instead, see _iter_products
+_PRODUCT_CLASS = "wake-product"
+
+
+def _iter_products(results_div):
+    """Yield product divs in document order, without walking their contents"""
+    # Lexbor's css() always matches the whole subtree; this walk skips each
+    # product's (large) location list and can stop after max_results
+    pending = [results_div.child]
+    while pending:
+        node = pending.pop()
+        while node is not None:
+            if (
+                node.tag == "div"
+                and _PRODUCT_CLASS in (node.attributes.get("class") or "").split()
+            ):
+                yield node
+            elif node.child is not None:
+                pending.append(node.next)
+                node = node.child
+                continue
+            node = node.next
+
+
+_SEARCH_RESULTS_URL = "https://wakeabc.com/search-results"
+
+
+@dataclass(frozen=True)
+class _Markup:
+    """Escaping and emphasis rules for one Telegram parse mode"""
+
+    name: str
+    escape: Callable[[str], str]
+    bold: str
+    italic: str
+    code: str
+
+    # Display line templates built from the rules above, filled with .format
+    name_line: str = field(init=False)
+    plu_line: str = field(init=False)
+    price_line: str = field(init=False)
+    city_line: str = field(init=False)
+    store_line: str = field(init=False)
+    more_stores_line: str = field(init=False)
+    more_cities_line: str = field(init=False)
+
+    def __post_init__(self):
+        templates = {
+            "name_line": "🍾 " + self.bold,
+            "plu_line": "📋 PLU: " + self.code,
+            "price_line": "💰 Price: " + self.bold,
+            "city_line": "  " + self.bold.format("• {}"),
+            "store_line": "    " + self.escape("-") + " {}",
+            "more_stores_line": "    " + self.italic,
+            "more_cities_line": "  " + self.italic,
+        }
+        for attr, template in templates.items():
+            object.__setattr__(self, attr, template)
+
+
+def _escape_html(text: str) -> str:
+    """Escape text for Telegram HTML (only <, > and & are special)"""
+    if not text:
+        return ""
+    return html.escape(text, quote=False)
+
+
+_MARKDOWN_V2 = _Markup(
+    name="markdown_v2", escape=escape_markdown, bold="*{}*", italic="_{}_", code="`{}`"
+)
+_HTML = _Markup(
+    name="html",
+    escape=_escape_html,
+    bold="<b>{}</b>",
+    italic="<i>{}</i>",
+    code="<code>{}</code>",
+)
+
+
 @dataclass
 class InventoryItem:
     """Data class for inventory items"""
@@ -31,23 +141,59 @@ class InventoryItem:
         if self.locations is None:
             self.locations = []
 
+    @cached_property
+    def total_stock(self) -> int:
+        """Total in-stock quantity across all locations"""
+        return sum(parse_location_stock(location) for location in self.locations)
+
+    @cached_property
+    def price_cents(self) -> Optional[int]:
+        """Price in integer cents, or None if it couldn't be parsed"""
+        return parse_price_cents(self.price)
+
+    @cached_property
+    def parsed_locations(self) -> List[Tuple[Optional[str], int, str]]:
+        """(city, stock, formatted location) for each location, parsed once"""
+        return [extract_city_and_stock(location) for location in self.locations]
+
+    @cached_property
+    def locations_hash(self) -> int:
+        """CRC32 of the location list, for cheap change detection"""
+        return zlib.crc32("\n".join(self.locations).encode())
+
 
 class WakeABCInventoryScraper:
     """
     A scraper for the Wake ABC Inventory website.
-    It uses requests to perform POST requests and BeautifulSoup4 to parse HTML.
+    It uses requests (or aiohttp from async code) to perform POST requests and
+    selectolax (Lexbor) to parse HTML.
     """
 
+    # Maximum number of formatted items kept for reuse across searches
+    _FORMAT_CACHE_SIZE = 2048
+
+    # Maximum number of distinct queries kept in the search results cache
+    _SEARCH_CACHE_SIZE = 256
+
     def __init__(self):
         """Initialize the scraper with a requests session"""
         self.session = requests.Session()
-        self.search_url = Config.WAKE_ABC_SEARCH_URL
+        # Keep connections to wakeabc.com alive between searches and retry
+        # briefly on connection failures
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.3),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self.session.headers.update(
             {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
                 "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
                 "Accept-Language": "en-US,en;q=0.5",
-                "Accept-Encoding": "gzip, deflate, br",
+                # Only the encodings urllib3 can decode (br needs brotli)
+                "Accept-Encoding": ACCEPT_ENCODING,
                 "Connection": "keep-alive",
                 "Upgrade-Insecure-Requests": "1",
             }
@@ -56,6 +202,17 @@ class WakeABCInventoryScraper:
         # Initialize city cache
         self.city_cache = WakeABCCityCache()
 
+        # Formatted display text keyed by the item fields that affect it
+        self._format_cache = OrderedDict()
+
+        # Created on first use by the async search, inside the running loop
+        self._async_session = None
+
+        # Recent search results keyed by lowercased query. The bot searches
+        # from worker threads, so access is guarded by a lock.
+        self._search_cache = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+
     def search_inventory(
         self, query: str, max_results: int = 10
     ) -> List[InventoryItem]:
@@ -74,6 +231,10 @@ class WakeABCInventoryScraper:
             return []
 
         query = query.strip()
+        cached = self._get_cached_search(query, max_results)
+        if cached is not None:
+            return cached
+
         logger.info(f"Searching inventory for: '{query}'")
 
         # Make HTTP request
@@ -81,19 +242,83 @@ class WakeABCInventoryScraper:
         if not response:
             return []
 
+        items = self._extract_items(response.content, query, max_results)
+        self._cache_search(query, max_results, items)
+        return items
+
+    async def search_inventory_async(
+        self, query: str, max_results: int = 10
+    ) -> List[InventoryItem]:
+        """Search the inventory without blocking the event loop"""
+        if not self._validate_search_query(query):
+            return []
+
+        query = query.strip()
+        cached = self._get_cached_search(query, max_results)
+        if cached is not None:
+            return cached
+
+        logger.info(f"Searching inventory for: '{query}'")
+
+        page = await self._make_search_request_async(query)
+        if page is None:
+            return []
+
+        # Parsing is CPU-bound, so keep it off the event loop too
+        items = await asyncio.to_thread(self._extract_items, page, query, max_results)
+        self._cache_search(query, max_results, items)
+        return items
+
+    def _get_cached_search(
+        self, query: str, max_results: int
+    ) -> Optional[List[InventoryItem]]:
+        """Return recent results for a query, or None if there are none"""
+        with self._search_cache_lock:
+            entry = self._search_cache.get(query.lower())
+            if entry is None:
+                return None
+
+            cached_at, fetched_max, items = entry
+            if time.monotonic() - cached_at >= Config.SEARCH_CACHE_TTL_SECONDS:
+                del self._search_cache[query.lower()]
+                return None
+
+            # Results cut off at a smaller max_results can't answer a bigger one
+            if fetched_max < max_results and len(items) >= fetched_max:
+                return None
+
+            self._search_cache.move_to_end(query.lower())
+            return items[:max_results]
+
+    def _cache_search(self, query: str, max_results: int, items: List[InventoryItem]):
+        """Remember the results of a search"""
+        # Network errors also come back as an empty list, so only cache hits
+        if not items:
+            return
+
+        with self._search_cache_lock:
+            self._search_cache[query.lower()] = (time.monotonic(), max_results, items)
+            self._search_cache.move_to_end(query.lower())
+            while len(self._search_cache) > self._SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+
+    def _extract_items(
+        self, page: bytes, query: str, max_results: int
+    ) -> List[InventoryItem]:
+        """Parse a search results page into InventoryItem objects"""
         # Parse HTML response
-        soup = self._parse_search_response(response)
-        if not soup:
+        root = self._parse_search_response(page)
+        if root is None:
             return []
 
         # Extract products from HTML
-        product_divs = self._extract_products_from_html(soup, query)
+        product_divs = self._extract_products_from_html(root, query, max_results)
         if not product_divs:
             return []
 
         # Process each product
         items = []
-        for product_div in product_divs[:max_results]:
+        for product_div in product_divs:
             item = self._extract_product_info(product_div)
             if item:
                 items.append(item)
@@ -110,64 +335,88 @@ class WakeABCInventoryScraper:
 
     def _make_search_request(self, query: str):
         """Make HTTP request to search endpoint"""
-        search_url = "https://wakeabc.com/search-results"
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        }
+        # The session already sends the User-Agent and keeps the connection alive
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
         data = {"productSearch": query}
 
         # Handle network requests with targeted exception handling
         try:
-            response = requests.post(search_url, data=data, headers=headers, timeout=30)
+            response = self.session.post(
+                _SEARCH_RESULTS_URL, data=data, headers=headers, timeout=30
+            )
             response.raise_for_status()
 
             # Debug: log response status and content length
             logger.debug(
-                f"Response status: {response.status_code}, Content length: {len(response.text)}"
+                f"Response status: {response.status_code}, Content length: {len(response.content)}"
             )
             return response
         except requests.RequestException as e:
             logger.error(f"Network error while searching inventory: {e}")
             return None
 
-    def _parse_search_response(self, response):
-        """Parse HTML response and return BeautifulSoup object"""
+    def _get_async_session(self) -> aiohttp.ClientSession:
+        """Return the aiohttp session, creating it if needed"""
+        if self._async_session is None or self._async_session.closed:
+            headers = dict(self.session.headers)
+            # Let aiohttp advertise only the encodings it can decode
+            headers.pop("Accept-Encoding", None)
+            self._async_session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit=8, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+        return self._async_session
+
+    async def _make_search_request_async(self, query: str) -> Optional[bytes]:
+        """Make the search request with aiohttp and return the page HTML"""
+        session = self._get_async_session()
+        data = {"productSearch": query}
+
         try:
-            soup = BeautifulSoup(response.text, "html.parser")
-            return soup
+            async with session.post(_SEARCH_RESULTS_URL, data=data) as response:
+                response.raise_for_status()
+                page = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Network error while searching inventory: {e}")
+            return None
+
+        logger.debug(f"Response status: {response.status}, Content length: {len(page)}")
+        return page
+
+    async def aclose(self):
+        """Close the HTTP sessions"""
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+        self.session.close()
+
+    def _parse_search_response(self, page: bytes):
+        """Parse HTML response and return the document tree"""
+        try:
+            # Bytes are decoded as UTF-8, which wakeabc.com serves
+            return LexborHTMLParser(page)
         except Exception as e:
             logger.error(f"Error parsing HTML response: {e}")
             return None
 
-    def _extract_products_from_html(self, soup, query: str):
-        """Extract product divs from search results"""
+    def _extract_products_from_html(self, root, query: str, max_results: int):
+        """Extract up to max_results product divs from search results"""
         # Find the search results container
-        results_div = soup.find("div", id="productSearchResults")
-        if not results_div:
-            logger.warning("Could not find productSearchResults div")
-            # Try to find it with different selectors
-            results_div = soup.find("div", {"id": "productSearchResults"})
-            if not results_div:
-                logger.warning(
-                    "Still could not find productSearchResults div, checking page content"
-                )
-                if "productSearchResults" in soup.get_text():
-                    logger.info(
-                        "productSearchResults found in HTML but not parsed correctly"
-                    )
-                else:
-                    logger.warning("productSearchResults not found in HTML at all")
-                return None
+        results_div = root.css_first(_CSS_RESULTS)
+        if results_div is None:
+            logger.warning("productSearchResults div not found in HTML")
+            return None
 
         # Check for no results message
-        no_results_text = results_div.get_text()
+        no_results_text = results_div.text()
         if "Sorry, your search did not return any results" in no_results_text:
             logger.info(f"No results found for query '{query}'")
             return None
 
         # Find all product entries
-        product_divs = results_div.find_all("div", class_="wake-product")
+        # Only the first max_results products are ever visited
+        product_divs = list(islice(_iter_products(results_div), max_results))
         if not product_divs:
             logger.warning("No product divs found in search results")
             return None
@@ -195,23 +444,23 @@ class WakeABCInventoryScraper:
     def _extract_basic_product_data(self, product_div) -> tuple:
         """Extract name, PLU code, price, and size from product div"""
         # Extract product name
-        name_elem = product_div.find("h4")
-        name = name_elem.get_text().strip() if name_elem else "Unknown Product"
+        name_elem = product_div.css_first(_CSS_NAME)
+        name = name_elem.text().strip() if name_elem is not None else "Unknown Product"
 
         # Extract PLU code
-        plu_elem = product_div.find("small")
+        plu_elem = product_div.css_first(_CSS_PLU)
         code = ""
-        if plu_elem:
-            plu_text = plu_elem.get_text()
+        if plu_elem is not None:
+            plu_text = plu_elem.text()
             if "PLU:" in plu_text:
                 code = plu_text.replace("PLU:", "").strip()
 
         # Extract price and size
-        price_elem = product_div.find("span", class_="price")
-        size_elem = product_div.find("span", class_="size")
+        price_elem = product_div.css_first(_CSS_PRICE)
+        size_elem = product_div.css_first(_CSS_SIZE)
 
-        price = price_elem.get_text().strip() if price_elem else "Price N/A"
-        size = size_elem.get_text().strip() if size_elem else "Size N/A"
+        price = price_elem.text().strip() if price_elem is not None else "Price N/A"
+        size = size_elem.text().strip() if size_elem is not None else "Size N/A"
 
         return name, code, price, size
 
@@ -221,28 +470,25 @@ class WakeABCInventoryScraper:
         availability = "Unknown"
 
         # Check for out of stock message
-        out_of_stock = product_div.find("p", class_="out-of-stock")
-        if out_of_stock:
+        out_of_stock = product_div.css_first(_CSS_OUT_OF_STOCK)
+        if out_of_stock is not None:
             availability = "Out of Stock"
         else:
             # Find inventory locations
-            inventory_div = product_div.find("div", class_="inventory-collapse")
-            if inventory_div:
-                location_items = inventory_div.find_all("li")
+            inventory_div = product_div.css_first(_CSS_INVENTORY)
+            if inventory_div is not None:
+                location_items = inventory_div.css(_CSS_LOCATION_ITEMS)
                 for item in location_items:
-                    address_span = item.find("span", class_="address")
-                    quantity_span = item.find("span", class_="quantity")
-
-                    if address_span and quantity_span:
-                        # Handle <br /> tags in address
-                        address_html = str(address_span)
-                        address = (
-                            BeautifulSoup(address_html, "html.parser")
-                            .get_text()
-                            .strip()
-                        )
-                        address = address.replace("\n", " ").replace("  ", " ")
-                        quantity = quantity_span.get_text().strip()
+                    address_span = item.css_first(_CSS_ADDRESS)
+                    quantity_span = item.css_first(_CSS_QUANTITY)
+
+                    if address_span is not None and quantity_span is not None:
+                        # <br /> tags contribute no text: the site's addresses
+                        # run street and city together ("Main St.Raleigh"),
+                        # which the city parsing relies on. Collapse any other
+                        # whitespace runs to single spaces.
+                        address = " ".join(address_span.text().split())
+                        quantity = quantity_span.text().strip()
                         locations.append(f"{address} - {quantity}")
 
                 if locations:
@@ -253,115 +499,138 @@ class WakeABCInventoryScraper:
         return availability, locations
 
     def format_item_for_display(self, item: InventoryItem) -> str:
-        """Format an inventory item for display in Telegram"""
-        lines = []
-
-        # Add basic item information
-        lines.extend(self._format_basic_info(item))
+        """Format an inventory item for display in Telegram (MarkdownV2)"""
+        return self._format_cached(item, _MARKDOWN_V2)
+
+    def format_item_for_display_html(self, item: InventoryItem) -> str:
+        """Format an inventory item for display in Telegram (HTML)"""
+        return self._format_cached(item, _HTML)
+
+    def _format_cached(self, item: InventoryItem, markup: "_Markup") -> str:
+        """Format an item, reusing the text rendered for an identical item"""
+        # The same products show up across related searches, so key the cache
+        # on every field that affects the output
+        key = (
+            markup.name,
+            item.name,
+            item.code,
+            item.size,
+            item.price,
+            item.availability,
+            tuple(item.locations),
+        )
+        cached = self._format_cache.get(key)
+        if cached is not None:
+            self._format_cache.move_to_end(key)
+            return cached
 
-        # Add availability status
-        lines.extend(self._format_availability(item))
+        text = self._format_item(item, markup)
+        self._format_cache[key] = text
+        while len(self._format_cache) > self._FORMAT_CACHE_SIZE:
+            self._format_cache.popitem(last=False)
 
-        # Add location information
-        lines.extend(self._format_locations(item))
+        return text
 
+    def _format_item(self, item: InventoryItem, markup: "_Markup") -> str:
+        """Build the display text for an inventory item"""
+        # Every section appends to the same list, joined once at the end
+        lines = []
+        self._format_basic_info(item, markup, lines)
+        self._format_availability(item, markup, lines)
+        self._format_locations(item, markup, lines)
         return "\n".join(lines)
 
-    def _format_basic_info(self, item: InventoryItem) -> List[str]:
+    def _format_basic_info(
+        self, item: InventoryItem, markup: "_Markup", lines: List[str]
+    ):
         """Format basic item information (name, code, size, price)"""
-        lines = []
-
-        name = escape_markdown(item.name)
-        lines.append(f"🍾 *{name}*")
+        lines.append(markup.name_line.format(markup.escape(item.name)))
 
         if item.code:
-            code = escape_markdown(item.code)
-            lines.append(f"📋 PLU: `{code}`")
+            lines.append(markup.plu_line.format(markup.escape(item.code)))
 
         if item.size:
-            size = escape_markdown(item.size)
-            lines.append(f"📏 Size: {size}")
+            lines.append("📏 Size: " + markup.escape(item.size))
 
         if item.price:
-            price = escape_markdown(item.price)
-            lines.append(f"💰 Price: *{price}*")
+            lines.append(markup.price_line.format(markup.escape(item.price)))
 
-        return lines
-
-    def _format_availability(self, item: InventoryItem) -> List[str]:
+    def _format_availability(
+        self, item: InventoryItem, markup: "_Markup", lines: List[str]
+    ):
         """Format availability status with appropriate emoji"""
-        lines = []
-
         if item.availability:
-            availability = escape_markdown(item.availability)
+            availability = markup.escape(item.availability)
             if "in stock" in item.availability.lower():
-                lines.append(f"✅ Status: {availability}")
+                lines.append("✅ Status: " + availability)
             elif "out of stock" in item.availability.lower():
-                lines.append(f"❌ Status: {availability}")
+                lines.append("❌ Status: " + availability)
             else:
-                lines.append(f"⚠️ Status: {availability}")
+                lines.append("⚠️ Status: " + availability)
 
-        return lines
-
-    def _format_locations(self, item: InventoryItem) -> List[str]:
+    def _format_locations(
+        self, item: InventoryItem, markup: "_Markup", lines: List[str]
+    ):
         """Format location information"""
-        lines = []
-
         if not item.locations:
-            return lines
+            return
 
         if len(item.locations) == 1:
-            lines.extend(self._format_single_location(item.locations[0]))
+            self._format_single_location(
+                item.locations[0], item.parsed_locations[0], markup, lines
+            )
         else:
-            city_groups = self._group_locations_by_city(item.locations)
+            city_groups = self._group_locations_by_city(
+                item.locations, item.parsed_locations
+            )
             if city_groups:
-                lines.extend(self._format_multiple_locations(city_groups))
-
-        return lines
-
-    def _format_single_location(self, location: str) -> List[str]:
+                self._format_multiple_locations(city_groups, markup, lines)
+
+    def _format_single_location(
+        self,
+        location: str,
+        parsed: Tuple[Optional[str], int, str],
+        markup: "_Markup",
+        lines: List[str],
+    ):
         """Format a single location"""
-        lines = []
-
-        city, stock_num, formatted_location = extract_city_and_stock(location)
+        city, stock_num, formatted_location = parsed
         if city:
-            formatted_location = escape_markdown(formatted_location)
-            lines.append(f"📍 Location: {formatted_location}")
+            lines.append("📍 Location: " + markup.escape(formatted_location))
         else:
-            location_escaped = escape_markdown(location)
-            lines.append(f"📍 Location: {location_escaped}")
-
-        return lines
-
-    def _group_locations_by_city(self, locations: List[str]) -> dict:
-        """Group locations by city and extract stock numbers"""
+            lines.append("📍 Location: " + markup.escape(location))
+
+    def _group_locations_by_city(
+        self,
+        locations: List[str],
+        parsed_locations: List[Tuple[Optional[str], int, str]],
+    ) -> dict:
+        """Group locations by city using their parsed stock numbers"""
         city_groups = {}
 
-        for location in locations:
-            city, stock_num, formatted_location = extract_city_and_stock(location)
+        for location, parsed in zip(locations, parsed_locations):
+            city, stock_num, formatted_location = parsed
             if city:
-                if city not in city_groups:
-                    city_groups[city] = []
-                city_groups[city].append((stock_num, formatted_location))
+                city_groups.setdefault(city, []).append((stock_num, formatted_location))
             else:
                 # Handle locations that couldn't be parsed
-                if "Other" not in city_groups:
-                    city_groups["Other"] = []
-                city_groups["Other"].append((0, location))
+                city_groups.setdefault("Other", []).append((0, location))
 
         return city_groups
 
-    def _format_multiple_locations(self, city_groups: dict) -> List[str]:
+    def _format_multiple_locations(
+        self, city_groups: dict, markup: "_Markup", lines: List[str]
+    ):
         """Format multiple locations grouped by city with limits"""
-        lines = ["📍 Locations:"]
-
-        # Sort cities by total stock (sum of all stores in that city)
-        city_totals = {
-            city: sum(stock for stock, _ in stores)
-            for city, stores in city_groups.items()
-        }
+        lines.append("📍 Locations:")
+        # (total stock, city, stores) sorted by the city's total stock
         sorted_cities = sorted(
-            city_groups.keys(), key=lambda c: city_totals[c], reverse=True
+            (
+                (sum(stock for stock, _ in stores), city, stores)
+                for city, stores in city_groups.items()
+            ),
+            key=itemgetter(0),
+            reverse=True,
         )
 
         cities_shown = 0
@@ -369,16 +638,11 @@ class WakeABCInventoryScraper:
         max_cities = 4  # Show up to 4 cities
         max_locations_per_city = 5  # Show up to 5 locations per city
 
-        for city in sorted_cities:
-            if cities_shown >= max_cities:
-                break
-
-            stores = city_groups[city]
+        for _, city, stores in sorted_cities[:max_cities]:
             # Sort stores within city by stock quantity (highest first)
-            stores.sort(key=lambda x: x[0], reverse=True)
+            stores = sorted(stores, key=itemgetter(0), reverse=True)
 
-            city_escaped = escape_markdown(city)
-            lines.append(f"  *• {city_escaped}*")
+            lines.append(markup.city_line.format(markup.escape(city)))
 
             stores_shown_in_city = 0
             for stock_num, formatted_location in stores:
@@ -388,13 +652,15 @@ class WakeABCInventoryScraper:
                 ):
                     remaining_in_city = len(stores) - stores_shown_in_city
                     if remaining_in_city > 0:
-                        lines.append(
-                            f"    _\\.\\.\\. and {remaining_in_city} more store{'s' if remaining_in_city != 1 else ''}_"
+                        more = markup.escape(
+                            f"... and {remaining_in_city} more store{'s' if remaining_in_city != 1 else ''}"
                         )
+                        lines.append(markup.more_stores_line.format(more))
                     break
 
-                location_escaped = escape_markdown(formatted_location)
-                lines.append(f"    \\- {location_escaped}")
+                lines.append(
+                    markup.store_line.format(markup.escape(formatted_location))
+                )
                 stores_shown_in_city += 1
                 locations_shown += 1
 
@@ -404,13 +670,12 @@ class WakeABCInventoryScraper:
         remaining_cities = len(sorted_cities) - cities_shown
         if remaining_cities > 0:
             total_remaining_locations = sum(
-                len(city_groups[city]) for city in sorted_cities[cities_shown:]
+                len(stores) for _, _, stores in sorted_cities[cities_shown:]
             )
-            lines.append(
-                f"  _\\.\\.\\. and {remaining_cities} more cit{'ies' if remaining_cities != 1 else 'y'} \\({total_remaining_locations} locations\\)_"
+            more = markup.escape(
+                f"... and {remaining_cities} more cit{'ies' if remaining_cities != 1 else 'y'} ({total_remaining_locations} locations)"
             )
-
-        return lines
+            lines.append(markup.more_cities_line.format(more))
 
     def check_keyword_availability(self, keyword: str) -> List[InventoryItem]:
         """Check if items matching a keyword are available"""
@@ -420,7 +685,22 @@ class WakeABCInventoryScraper:
             logger.error(f"Error checking keyword availability for '{keyword}': {e}")
             return []
 
-        # Filter for available items only
+        return self._filter_available(items)
+
+    async def check_keyword_availability_async(
+        self, keyword: str
+    ) -> List[InventoryItem]:
+        """Check if items matching a keyword are available without blocking"""
+        try:
+            items = await self.search_inventory_async(keyword, max_results=20)
+        except Exception as e:
+            logger.error(f"Error checking keyword availability for '{keyword}': {e}")
+            return []
+
+        return self._filter_available(items)
+
+    def _filter_available(self, items: List[InventoryItem]) -> List[InventoryItem]:
+        """Keep only the items that are available"""
         available_items = [
             item
             for item in items
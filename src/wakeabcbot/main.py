@@ -10,7 +10,10 @@ import sys
 
 from .bot import WakeABCBot
 from .config import Config
+from .inventory_scraper import WakeABCInventoryScraper
 from .monitor import MonitoringService
+from .rate_limiter import TelegramRateLimiter
+from .utils import run_async
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +25,7 @@ class WakeABCBotApp:
         """Initialize the application"""
         self.bot = None
         self.monitoring_service = None
+        self.scraper = None
         self.bot_task = None
         self.monitor_task = None
         self.shutdown_event = asyncio.Event()
@@ -33,9 +37,17 @@ class WakeABCBotApp:
 
         logger.info("Starting Wake ABC Inventory Bot Application...")
 
-        # Initialize services
-        self.bot = WakeABCBot()
-        self.monitoring_service = MonitoringService(Config.TELEGRAM_BOT_TOKEN)
+        self._install_signal_handlers()
+
+        # Initialize services. They share one scraper so searches reuse the
+        # same connection pool and results cache, and one rate limiter so
+        # replies and notifications stay under Telegram's global limit together.
+        self.scraper = WakeABCInventoryScraper()
+        rate_limiter = TelegramRateLimiter()
+        self.bot = WakeABCBot(scraper=self.scraper, rate_limiter=rate_limiter)
+        self.monitoring_service = MonitoringService(
+            Config.TELEGRAM_BOT_TOKEN, scraper=self.scraper, rate_limiter=rate_limiter
+        )
 
         # Start monitoring service first
         logger.info("Starting monitoring service...")
@@ -106,28 +118,29 @@ class WakeABCBotApp:
             except asyncio.TimeoutError:
                 logger.warning("Monitoring service stop timed out")
 
+        # Close the scraper's HTTP sessions once both services are done
+        if self.scraper:
+            await self.scraper.aclose()
+
         logger.info("✅ Application stopped successfully")
 
-    def setup_signal_handlers(self):
+    def _install_signal_handlers(self):
         """Setup signal handlers for graceful shutdown"""
+        loop = asyncio.get_running_loop()
 
-        def signal_handler(signum, frame):
+        def signal_handler(signum, frame=None):
             logger.info(f"Received shutdown signal ({signum})")
             if self.running:
-                # Set the shutdown event
-                asyncio.create_task(self._trigger_shutdown())
-
-        async def _trigger_shutdown():
-            """Trigger shutdown in async context"""
-            self.shutdown_event.set()
-
-        self._trigger_shutdown = _trigger_shutdown
+                loop.call_soon_threadsafe(self.shutdown_event.set)
 
         # Handle SIGINT (Ctrl+C) and SIGTERM
         for sig in (signal.SIGINT, signal.SIGTERM):
             try:
+                loop.add_signal_handler(sig, signal_handler, sig)
+            except NotImplementedError:
+                # No add_signal_handler on Windows event loops
                 signal.signal(sig, signal_handler)
-            except ValueError:
+            except (ValueError, RuntimeError):
                 # Some signals may not be available on all platforms
                 pass
 
@@ -140,9 +153,6 @@ async def main():
     app = WakeABCBotApp()
 
     try:
-        # Setup signal handlers
-        app.setup_signal_handlers()
-
         # Start the application
         await app.start()
 
@@ -159,7 +169,7 @@ async def main():
 if __name__ == "__main__":
     # Run the application
     try:
-        asyncio.run(main())
+        run_async(main())
     except KeyboardInterrupt:
         print("\n👋 Wake ABC Bot stopped by user")
     except Exception as e:
@@ -4,40 +4,85 @@ Uses importlib.resources to load large text templates from the messages folder
 """
 
 import logging
+import string
 from importlib import resources
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 
+def _load_all_templates() -> Mapping[str, str]:
+    """Read every template in the messages package"""
+    templates = {}
+    try:
+        for path in resources.files("wakeabcbot.messages").iterdir():
+            if not path.name.endswith(".txt"):
+                continue
+            try:
+                templates[path.name] = path.read_text(encoding="utf-8").strip()
+            except Exception as e:
+                logger.error(f"Error loading message template {path.name}: {e}")
+                templates[path.name] = f"[Error loading template {path.name}]"
+    except Exception as e:
+        logger.error(f"Error loading message templates: {e}")
+    return MappingProxyType(templates)
+
+
+def _split_template(text: str) -> Optional[Tuple[Tuple[str, Optional[str]], ...]]:
+    """Split a template into (literal text, field name) pairs"""
+    try:
+        parsed = list(string.Formatter().parse(text))
+    except ValueError:
+        return None
+
+    # Conversions and format specs are left to str.format
+    if any(spec or conversion for _, _, spec, conversion in parsed):
+        return None
+    return tuple((literal, field) for literal, field, _, _ in parsed)
+
+
+# The template set is small and fixed, so read it all once at import
+_TEMPLATES = _load_all_templates()
+
+# Placeholders are located once here rather than by str.format on every call
+_SPLIT_TEMPLATES = MappingProxyType(
+    {name: _split_template(text) for name, text in _TEMPLATES.items()}
+)
+
+
 class MessageLoader:
     """Utility class for loading large message templates"""
 
     def __init__(self):
         """Initialize the message loader"""
-        self._cache = {}
+        self._templates = _TEMPLATES
+        self._split_templates = _SPLIT_TEMPLATES
 
     def _load_template(self, filename: str) -> str:
-        """Load a message template from file using importlib.resources"""
-        if filename in self._cache:
-            return self._cache[filename]
-
-        try:
-            # Load the text file from the messages package
-            with resources.open_text("wakeabcbot.messages", filename) as f:
-                content = f.read().strip()
-                self._cache[filename] = content
-                return content
-        except FileNotFoundError:
+        """Return a message template loaded from the messages package"""
+        template = self._templates.get(filename)
+        if template is None:
             logger.error(f"Message template file not found: {filename}")
             return f"[Template {filename} not found]"
-        except Exception as e:
-            logger.error(f"Error loading message template {filename}: {e}")
-            return f"[Error loading template {filename}]"
+        return template
+
+    def _render_template(self, filename: str, **values) -> str:
+        """Load a message template and fill in its placeholders"""
+        pieces = self._split_templates.get(filename)
+        if pieces is None:
+            return self._load_template(filename).format(**values)
+
+        parts = []
+        for literal, field in pieces:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
 
     def get_welcome_message(self, first_name: str) -> str:
         """Get formatted welcome message"""
-        template = self._load_template("welcome.txt")
-        return template.format(first_name=first_name)
+        return self._render_template("welcome.txt", first_name=first_name)
 
     def get_help_message(self) -> str:
         """Get help message"""
@@ -53,28 +98,25 @@ class MessageLoader:
 
     def get_add_success_message(self, keyword: str) -> str:
         """Get add keyword success message"""
-        template = self._load_template("add_success.txt")
-        return template.format(keyword=keyword)
+        return self._render_template("add_success.txt", keyword=keyword)
 
     def get_remove_success_message(self, keyword: str) -> str:
         """Get remove keyword success message"""
-        template = self._load_template("remove_success.txt")
-        return template.format(keyword=keyword)
+        return self._render_template("remove_success.txt", keyword=keyword)
 
     def get_remove_not_found_message(self, keyword: str) -> str:
         """Get remove keyword not found message"""
-        template = self._load_template("remove_not_found.txt")
-        return template.format(keyword=keyword)
+        return self._render_template("remove_not_found.txt", keyword=keyword)
 
     def get_notification_footer(self, keyword: str) -> str:
         """Get notification footer with tips"""
-        template = self._load_template("notification_footer.txt")
-        return template.format(keyword=keyword)
+        return self._render_template("notification_footer.txt", keyword=keyword)
 
     def get_watchlist_tips(self, check_interval: int) -> str:
         """Get watchlist tips section"""
-        template = self._load_template("watchlist_tips.txt")
-        return template.format(check_interval=check_interval)
+        return self._render_template(
+            "watchlist_tips.txt", check_interval=check_interval
+        )
 
 
 # Create a global instance for easy access
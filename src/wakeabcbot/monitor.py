@@ -4,31 +4,80 @@ Handles periodic inventory checks and notifications for watchlist items
 """
 
 import asyncio
+import heapq
 import logging
-from typing import Dict, List
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
-from telegram import Bot
+import httpx
 from telegram.constants import ParseMode
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
 
 from .config import Config
 from .database import Database
 from .inventory_scraper import InventoryItem, WakeABCInventoryScraper
 from .message_loader import message_loader
-from .utils import WakeABCCityCache, escape_markdown, extract_city_and_stock
+from .rate_limiter import TelegramRateLimiter
+from .utils import WakeABCCityCache, escape_markdown, run_async
 
 logger = logging.getLogger(__name__)
 
+# Notification headers, filled in with the escaped keyword and item count
+_NEW_ITEM_HEADER = "🔔 *New Item Available\\!*\n\nYour watchlist keyword '*{keyword}*' has a match:\n\n"
+_NEW_ITEMS_HEADER = "🔔 *New Items Available\\!*\n\nYour watchlist keyword '*{keyword}*' has {count} matches:\n\n"
+_ITEM_UPDATE_HEADER = (
+    "🔔 *Item Update\\!*\n\nYour watchlist keyword '*{keyword}*' has changes:\n\n"
+)
+_ITEM_UPDATES_HEADER = "🔔 *Item Updates\\!*\n\nYour watchlist keyword '*{keyword}*' has {count} items with changes:\n\n"
+
+
+def _more_items_line(count: int) -> str:
+    """Line noting how many items were left out of a notification"""
+    return f"_\\.\\.\\. and {count} more item{'s' if count != 1 else ''}_\n\n"
+
+
+# Each watched keyword gets the same footer on every notification; sized to
+# hold every distinct keyword of a busy bot
+@lru_cache(maxsize=1024)
+def _notification_footer(keyword_escaped: str) -> str:
+    """Render the notification footer for an escaped keyword"""
+    return message_loader.get_notification_footer(keyword_escaped)
+
 
 class InventoryMonitor:
     """Monitors inventory for watchlist items and sends notifications"""
 
-    def __init__(self, bot_token: str):
-        """Initialize the monitor"""
-        self.bot = Bot(token=bot_token)
+    def __init__(
+        self,
+        bot_token: str,
+        scraper: Optional[WakeABCInventoryScraper] = None,
+        rate_limiter: Optional[TelegramRateLimiter] = None,
+    ):
+        """Initialize the monitor, optionally sharing another component's scraper"""
+        # Notifications go out concurrently, so they share the bot's pacing.
+        # The pool fits the rate limiter's concurrency, and connections stay
+        # open between the sends of one check instead of httpx's default 5s.
+        request = HTTPXRequest(
+            pool_timeout=5.0,
+            httpx_kwargs={
+                "limits": httpx.Limits(max_connections=32, keepalive_expiry=60)
+            },
+        )
+        self.bot = ExtBot(
+            token=bot_token,
+            request=request,
+            rate_limiter=rate_limiter or TelegramRateLimiter(),
+        )
         self.db = Database()
-        self.scraper = WakeABCInventoryScraper()
+        # A scraper passed in is owned, and closed, by the caller
+        self._owns_scraper = scraper is None
+        self.scraper = scraper or WakeABCInventoryScraper()
         self.is_running = False
         self.check_interval = Config.CHECK_INTERVAL_MINUTES * 60  # Convert to seconds
+        self.last_prune_time = None
 
         # Initialize city cache
         self.city_cache = WakeABCCityCache()
@@ -40,13 +89,25 @@ class InventoryMonitor:
             return
 
         self.is_running = True
+
+        # Open the bot's HTTP connection up front; sends still work (and
+        # connect lazily) if this fails
+        try:
+            await self.bot.initialize()
+        except Exception as e:
+            logger.warning(f"Could not initialize notification bot: {e}")
+
         logger.info(
             f"Starting inventory monitoring (checking every {Config.CHECK_INTERVAL_MINUTES} minutes)"
         )
 
         try:
             while self.is_running:
+                # Load (or renew) the store cities up front so address parsing
+                # never has to fetch them from inside the loop
+                await self.city_cache.refresh_async()
                 await self._check_watchlist_items()
+                self._prune_notifications_if_due()
 
                 # Wait for the next check
                 if self.is_running:
@@ -58,6 +119,18 @@ class InventoryMonitor:
             self.is_running = False
             raise
 
+    def _prune_notifications_if_due(self):
+        """Delete old notification records once a day"""
+        now = time.monotonic()
+        if self.last_prune_time is not None and now - self.last_prune_time < 86400:
+            return
+
+        self.last_prune_time = now
+        try:
+            self.db.prune_notifications()
+        except Exception as e:
+            logger.error(f"Error pruning notifications: {e}")
+
     def stop_monitoring(self):
         """Stop the monitoring loop"""
         logger.info("Stopping inventory monitoring")
@@ -67,37 +140,46 @@ class InventoryMonitor:
         """Check all watchlist items for availability"""
         logger.info("Starting watchlist check")
 
-        # Get all watchlist keywords from all users
+        # Get the users watching each keyword, so each keyword is searched once
         try:
-            watchlist_items = self.db.get_all_watchlist_keywords()
+            keyword_to_users = self.db.get_watchlist_grouped_by_keyword()
         except Exception as e:
             logger.error(f"Error getting watchlist items: {e}")
             return
 
-        if not watchlist_items:
+        if not keyword_to_users:
             logger.info("No watchlist items to check")
             return
 
-        logger.info(f"Checking {len(watchlist_items)} watchlist items")
+        total_items = sum(len(user_ids) for user_ids in keyword_to_users.values())
+        logger.info(f"Checking {total_items} watchlist items")
 
-        # Group by keyword to avoid duplicate searches
-        keyword_to_users = {}
-        for user_id, keyword in watchlist_items:
-            if keyword not in keyword_to_users:
-                keyword_to_users[keyword] = []
-            keyword_to_users[keyword].append(user_id)
+        # Check the unique keywords concurrently, a few at a time
+        semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_SEARCHES)
 
-        # Check each unique keyword
-        for keyword, user_ids in keyword_to_users.items():
-            try:
+        async def check_keyword(keyword: str, user_ids: List[int]):
+            async with semaphore:
+                loop = asyncio.get_running_loop()
+                started = loop.time()
                 await self._check_keyword_for_users(keyword, user_ids)
 
-                # Small delay between searches to be respectful to the server
-                await asyncio.sleep(2)
-
-            except Exception as e:
-                logger.error(f"Error checking keyword '{keyword}': {e}")
-                continue
+                # Keep searches from this slot at least SEARCH_DELAY_SECONDS
+                # apart, to be respectful to the server; a slow check has
+                # already waited long enough
+                delay = Config.SEARCH_DELAY_SECONDS - (loop.time() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        results = await asyncio.gather(
+            *(
+                check_keyword(keyword, user_ids)
+                for keyword, user_ids in keyword_to_users.items()
+            ),
+            return_exceptions=True,
+        )
+        for keyword, result in zip(keyword_to_users, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error checking keyword '{keyword}': {result}")
 
         logger.info("Completed watchlist check")
 
@@ -107,7 +189,9 @@ class InventoryMonitor:
 
         # Search for available items matching the keyword
         try:
-            available_items = self.scraper.check_keyword_availability(keyword)
+            available_items = await self.scraper.check_keyword_availability_async(
+                keyword
+            )
         except Exception as e:
             logger.error(f"Error checking keyword '{keyword}': {e}")
             return
@@ -120,56 +204,118 @@ class InventoryMonitor:
             f"Found {len(available_items)} available items for keyword '{keyword}'"
         )
 
-        # Notify each user who has this keyword in their watchlist
+        # Fetch every user's previous snapshots for this keyword in one query
+        try:
+            snapshots_by_user = self.db.get_snapshots_for_users(user_ids, keyword)
+        except Exception as e:
+            logger.error(f"Error getting snapshots for '{keyword}': {e}")
+            return
+
+        # Work out what changed for each user who has this keyword. Users
+        # whose changes match share one rendered message.
+        notifications = []
+        messages = {}
         for user_id in user_ids:
             try:
-                await self._notify_user_about_items(user_id, keyword, available_items)
+                notification = self._prepare_user_notification(
+                    user_id,
+                    keyword,
+                    available_items,
+                    snapshots_by_user[user_id],
+                    messages,
+                )
             except Exception as e:
                 logger.error(f"Error notifying user {user_id} about '{keyword}': {e}")
                 continue
+            if notification:
+                notifications.append((user_id, *notification))
+
+        # Send the notifications concurrently; the bot's rate limiter keeps
+        # them within Telegram's limits
+        results = await asyncio.gather(
+            *(
+                self._send_user_notification(
+                    user_id, keyword, items, message, available_items
+                )
+                for user_id, items, message in notifications
+            ),
+            return_exceptions=True,
+        )
+        for (user_id, _, _), result in zip(notifications, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Error notifying user {user_id} about '{keyword}': {result}"
+                )
 
-    async def _notify_user_about_items(
-        self, user_id: int, keyword: str, items: List[InventoryItem]
-    ):
-        """Notify a specific user about available items based on changes from previous snapshots"""
+    def _prepare_user_notification(
+        self,
+        user_id: int,
+        keyword: str,
+        items: List[InventoryItem],
+        snapshots: Dict[Tuple[str, str], Dict],
+        messages: Dict[Tuple, str],
+    ) -> Optional[Tuple[List[InventoryItem], str]]:
+        """Compare items with a user's previous snapshots and build the notification for any changes"""
         # Check each item for significant changes
         items_to_notify = []
         notification_reasons = []
+        # (item index, reasons) pairs, identifying the message's content
+        changes = []
 
-        for item in items:
+        for index, item in enumerate(items):
             should_notify, reasons = self.db.should_notify_about_item(
-                user_id, keyword, item
+                user_id, keyword, item, snapshots
             )
             if should_notify:
                 items_to_notify.append(item)
                 notification_reasons.append(reasons)
-
-            # Save the current snapshot for future comparison
-            self.db.save_item_snapshot(user_id, keyword, item)
+                changes.append((index, tuple(reasons)))
 
         if not items_to_notify:
+            # Nothing to send, so the current state can be recorded right away
+            self.db.save_item_snapshots_bulk(user_id, keyword, items)
             logger.debug(
                 f"No items with significant changes to notify user {user_id} about for keyword '{keyword}'"
             )
-            return
-
+            return None
+
+        # Create notification message with change reasons, unless another
+        # user already got the same changes
+        key = tuple(changes)
+        message = messages.get(key)
+        if message is None:
+            message = self._create_change_notification_message(
+                keyword, items_to_notify, notification_reasons
+            )
+            messages[key] = message
+        return items_to_notify, message
+
+    async def _send_user_notification(
+        self,
+        user_id: int,
+        keyword: str,
+        items: List[InventoryItem],
+        message: str,
+        available_items: List[InventoryItem],
+    ):
+        """Send a prepared notification to a user and record it"""
         logger.info(
-            f"Notifying user {user_id} about {len(items_to_notify)} changed items for keyword '{keyword}'"
-        )
-
-        # Create notification message with change reasons
-        message = self._create_change_notification_message(
-            keyword, items_to_notify, notification_reasons
+            f"Notifying user {user_id} about {len(items)} changed items for keyword '{keyword}'"
         )
 
-        # Send notification to user
         await self.bot.send_message(
             chat_id=user_id, text=message, parse_mode=ParseMode.MARKDOWN_V2
         )
 
+        # Only now that the user has been told, save the current snapshots for
+        # future comparison; a failed send leaves the changes to be reported
+        # on the next check
+        self.db.save_item_snapshots_bulk(user_id, keyword, available_items)
+
         # Record notifications in database
-        for item in items_to_notify:
-            self.db.add_notification(user_id, keyword, item.name, item.code)
+        self.db.add_notifications_bulk(
+            user_id, keyword, [(item.name, item.code) for item in items]
+        )
 
         logger.info(
             f"Successfully notified user {user_id} about '{keyword}' item changes"
@@ -182,41 +328,31 @@ class InventoryMonitor:
 
         keyword_escaped = escape_markdown(keyword)
 
-        if len(items) == 1:
-            header = f"🔔 *New Item Available\\!*\n\nYour watchlist keyword '*{keyword_escaped}*' has a match:\n\n"
-        else:
-            header = f"🔔 *New Items Available\\!*\n\nYour watchlist keyword '*{keyword_escaped}*' has {len(items)} matches:\n\n"
-
-        message = header
+        header = _NEW_ITEM_HEADER if len(items) == 1 else _NEW_ITEMS_HEADER
+        parts = [header.format(keyword=keyword_escaped, count=len(items))]
 
         for i, item in enumerate(
             items[:5], 1
         ):  # Limit to 5 items to avoid message length issues
             formatted_item = self._format_item_for_notification(item)
-            message += f"*{i}\\.* {formatted_item}\n\n"
+            parts.append(f"*{i}\\.* {formatted_item}\n\n")
 
         if len(items) > 5:
-            message += f"_\\.\\.\\. and {len(items) - 5} more item{'s' if len(items) - 5 != 1 else ''}_\n\n"
+            parts.append(_more_items_line(len(items) - 5))
 
         # Add footer with helpful information
-        message += message_loader.get_notification_footer(keyword_escaped)
+        parts.append(_notification_footer(keyword_escaped))
 
-        return message
+        return "".join(parts)
 
     def _create_change_notification_message(
         self, keyword: str, items: List[InventoryItem], reasons_list: List[List[str]]
     ) -> str:
         """Create a notification message for items with change reasons"""
-        from .utils import escape_markdown
-
         keyword_escaped = escape_markdown(keyword)
 
-        if len(items) == 1:
-            header = f"🔔 *Item Update\\!*\n\nYour watchlist keyword '*{keyword_escaped}*' has changes:\n\n"
-        else:
-            header = f"🔔 *Item Updates\\!*\n\nYour watchlist keyword '*{keyword_escaped}*' has {len(items)} items with changes:\n\n"
-
-        message = header
+        header = _ITEM_UPDATE_HEADER if len(items) == 1 else _ITEM_UPDATES_HEADER
+        parts = [header.format(keyword=keyword_escaped, count=len(items))]
 
         for i, (item, reasons) in enumerate(
             zip(items[:5], reasons_list[:5]), 1
@@ -229,15 +365,15 @@ class InventoryMonitor:
                 escaped_reasons = [escape_markdown(reason) for reason in reasons]
                 reasons_text = f"\n📌 *Changes:* {', '.join(escaped_reasons)}"
 
-            message += f"*{i}\\.* {formatted_item}{reasons_text}\n\n"
+            parts.append(f"*{i}\\.* {formatted_item}{reasons_text}\n\n")
 
         if len(items) > 5:
-            message += f"_\\.\\.\\. and {len(items) - 5} more item{'s' if len(items) - 5 != 1 else ''}_\n\n"
+            parts.append(_more_items_line(len(items) - 5))
 
         # Add footer with helpful information
-        message += message_loader.get_notification_footer(keyword_escaped)
+        parts.append(_notification_footer(keyword_escaped))
 
-        return message
+        return "".join(parts)
 
     def _format_item_for_notification(self, item: InventoryItem) -> str:
         """Format an item for notification (more compact than search results)"""
@@ -279,9 +415,15 @@ class InventoryMonitor:
             return lines
 
         if len(item.locations) == 1:
-            lines.extend(self._format_notification_single_location(item.locations[0]))
+            lines.extend(
+                self._format_notification_single_location(
+                    item.locations[0], item.parsed_locations[0]
+                )
+            )
         else:
-            city_groups = self._group_notification_locations_by_city(item.locations)
+            city_groups = self._group_notification_locations_by_city(
+                item.parsed_locations
+            )
             if city_groups:
                 lines.extend(
                     self._format_notification_multiple_locations(
@@ -291,11 +433,13 @@ class InventoryMonitor:
 
         return lines
 
-    def _format_notification_single_location(self, location: str) -> List[str]:
+    def _format_notification_single_location(
+        self, location: str, parsed: Tuple[Optional[str], int, str]
+    ) -> List[str]:
         """Format a single location for notifications"""
         lines = []
 
-        city, stock_num, formatted_location = extract_city_and_stock(location)
+        city, stock_num, formatted_location = parsed
         if city:
             formatted_location = escape_markdown(formatted_location)
             lines.append(f"📍 {formatted_location}")
@@ -305,59 +449,55 @@ class InventoryMonitor:
 
         return lines
 
-    def _group_notification_locations_by_city(self, locations: List[str]) -> dict:
-        """Group locations by city for notifications"""
-        city_groups = {}
+    def _group_notification_locations_by_city(
+        self, parsed_locations: List[Tuple[Optional[str], int, str]]
+    ) -> Dict[str, Dict]:
+        """Group parsed locations by city, tracking each city's total stock and best store"""
+        city_groups = defaultdict(
+            lambda: {"total": 0, "count": 0, "top_stock": -1, "top_store": None}
+        )
 
-        for location in locations:
-            city, stock_num, formatted_location = extract_city_and_stock(location)
+        for city, stock_num, formatted_location in parsed_locations:
             if city:
-                if city not in city_groups:
-                    city_groups[city] = []
-                city_groups[city].append((stock_num, formatted_location))
+                group = city_groups[city]
+                group["total"] += stock_num
+                group["count"] += 1
+                # Ties keep the first store listed
+                if stock_num > group["top_stock"]:
+                    group["top_stock"] = stock_num
+                    group["top_store"] = formatted_location
 
         return city_groups
 
     def _format_notification_multiple_locations(
-        self, city_groups: dict, all_locations: List[str]
+        self, city_groups: Dict[str, Dict], all_locations: List[str]
     ) -> List[str]:
         """Format multiple locations for notifications with city grouping"""
         lines = []
 
-        # Sort cities by total stock and show top 2 cities for notifications
-        city_totals = {
-            city: sum(stock for stock, _ in stores)
-            for city, stores in city_groups.items()
-        }
-        sorted_cities = sorted(
-            city_groups.keys(), key=lambda c: city_totals[c], reverse=True
-        )
-
-        if len(sorted_cities) == 1:
-            lines.extend(
-                self._format_notification_single_city(
-                    sorted_cities[0], city_groups, all_locations
-                )
-            )
+        if len(city_groups) == 1:
+            (group,) = city_groups.values()
+            lines.extend(self._format_notification_single_city(group, all_locations))
         else:
+            # Show the top 2 cities by total stock for notifications
+            top_cities = heapq.nlargest(
+                2, city_groups.items(), key=lambda city_group: city_group[1]["total"]
+            )
             lines.extend(
-                self._format_notification_multiple_cities(sorted_cities, city_groups)
+                self._format_notification_multiple_cities(top_cities, city_groups)
             )
 
         return lines
 
     def _format_notification_single_city(
-        self, city: str, city_groups: dict, all_locations: List[str]
+        self, group: Dict, all_locations: List[str]
     ) -> List[str]:
         """Format notification for items available in a single city"""
         lines = []
 
-        stores = city_groups[city]
-        stores.sort(key=lambda x: x[0], reverse=True)
-        top_store = stores[0][1]
         remaining = len(all_locations) - 1
 
-        store_escaped = escape_markdown(top_store)
+        store_escaped = escape_markdown(group["top_store"])
         if remaining > 0:
             lines.append(f"📍 {store_escaped} \\(\\+{remaining} more\\)")
         else:
@@ -366,25 +506,23 @@ class InventoryMonitor:
         return lines
 
     def _format_notification_multiple_cities(
-        self, sorted_cities: List[str], city_groups: dict
+        self, top_cities: List[Tuple[str, Dict]], city_groups: Dict[str, Dict]
     ) -> List[str]:
         """Format notification for items available in multiple cities"""
         lines = ["📍 Available in:"]
 
         # Show top 2 cities with their best store
-        for i, city in enumerate(sorted_cities[:2]):
-            stores = city_groups[city]
-            stores.sort(key=lambda x: x[0], reverse=True)
-            top_store = stores[0][1]
-
+        for city, group in top_cities:
             city_escaped = escape_markdown(city)
-            store_escaped = escape_markdown(top_store)
+            store_escaped = escape_markdown(group["top_store"])
             lines.append(f"  *• {city_escaped}*: {store_escaped}")
 
         # Show remaining cities if any
-        if len(sorted_cities) > 2:
-            remaining_cities = len(sorted_cities) - 2
-            total_remaining = sum(len(city_groups[city]) for city in sorted_cities[2:])
+        remaining_cities = len(city_groups) - len(top_cities)
+        if remaining_cities > 0:
+            total_remaining = sum(
+                group["count"] for group in city_groups.values()
+            ) - sum(group["count"] for _, group in top_cities)
             lines.append(
                 f"  _\\.\\.\\. and {remaining_cities} more cit{'ies' if remaining_cities != 1 else 'y'} \\({total_remaining} stores\\)_"
             )
@@ -424,7 +562,7 @@ class InventoryMonitor:
             active_users = self.db.get_active_users()
 
             # Group watchlist items by keyword
-            unique_keywords = set(keyword for _, keyword in watchlist_items)
+            unique_keywords = {keyword for _, keyword in watchlist_items}
 
             return {
                 "is_running": self.is_running,
@@ -443,9 +581,14 @@ class InventoryMonitor:
 class MonitoringService:
     """Service for monitoring inventory and sending notifications"""
 
-    def __init__(self, bot_token: str):
+    def __init__(
+        self,
+        bot_token: str,
+        scraper: Optional[WakeABCInventoryScraper] = None,
+        rate_limiter: Optional[TelegramRateLimiter] = None,
+    ):
         """Initialize the monitoring service"""
-        self.monitor = InventoryMonitor(bot_token)
+        self.monitor = InventoryMonitor(bot_token, scraper, rate_limiter)
         self.monitor_task = None
 
     async def start(self):
@@ -471,6 +614,12 @@ class MonitoringService:
             except asyncio.CancelledError:
                 pass
 
+        if self.monitor:
+            await self.monitor.bot.shutdown()
+            if self.monitor._owns_scraper:
+                await self.monitor.scraper.aclose()
+            self.monitor.db.close()
+
     async def get_status(self) -> Dict:
         """Get monitoring service status"""
         if self.monitor:
@@ -520,4 +669,4 @@ if __name__ == "__main__":
     # Set up secure logging for standalone execution
     Config.setup_logging()
 
-    asyncio.run(main())
+    run_async(main())
@@ -0,0 +1,67 @@
+"""
+Outgoing Telegram API rate limiting
+Caps concurrent requests and pauses all of them when Telegram asks us to back off
+"""
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """Global rate limiter shared by every Bot API call the application makes"""
+
+    def __init__(self, max_concurrent: int = 25):
+        """Initialize the rate limiter"""
+        # Caps how many requests are in flight at once. This is not a
+        # per-second limit; Telegram's flood control is handled through the
+        # RetryAfter pause below.
+        self._send_sem = asyncio.Semaphore(max_concurrent)
+        self._retry_after_until = 0.0
+
+    async def initialize(self):
+        """Nothing to set up"""
+
+    async def shutdown(self):
+        """Nothing to clean up"""
+
+    async def _wait_for_retry_after(self):
+        """Sleep until any retry_after pause requested by Telegram has passed"""
+        loop = asyncio.get_running_loop()
+        delay = self._retry_after_until - loop.time()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._retry_after_until - loop.time()
+
+    async def process_request(
+        self, callback, args, kwargs, endpoint, data, rate_limit_args
+    ):
+        """Run a Bot API request, retrying once after a RetryAfter response"""
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(2):
+            await self._wait_for_retry_after()
+
+            async with self._send_sem:
+                try:
+                    return await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    if attempt:
+                        raise
+
+                    retry_after = e.retry_after
+                    if isinstance(retry_after, timedelta):
+                        retry_after = retry_after.total_seconds()
+
+                    logger.warning(
+                        f"Telegram flood control on {endpoint}, "
+                        f"pausing all requests for {retry_after} seconds"
+                    )
+                    self._retry_after_until = max(
+                        self._retry_after_until, loop.time() + retry_after
+                    )
@@ -3,11 +3,16 @@ Shared utility functions for Wake ABC Telegram Bot
 Contains common functionality used across multiple modules
 """
 
+import asyncio
 import logging
 import re
+import threading
 import time
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Coroutine, List, Optional, Tuple
 
+import aiohttp
+import orjson
 import requests
 
 logger = logging.getLogger(__name__)
@@ -28,6 +33,68 @@ _DEFAULT_CITIES = [
     "Rolesville",
 ]
 
+# First number in a quantity string like "224 in stock"
+_QUANTITY_RE = re.compile(r"\d+")
+
+# Dollar amount once "$" and thousands separators are removed, e.g. "1299.99"
+_PRICE_RE = re.compile(r"(\d+)(?:\.(\d{1,2}))?")
+
+# Words before a state code, e.g. "Raleigh" in "123 Main StRaleigh, NC 27601"
+_CITY_STATE_RE = re.compile(r"([A-Za-z\s]+),\s*[A-Z]{2}")
+
+# Backslash-escapes every character MarkdownV2 treats as special
+_MARKDOWN_ESCAPES = str.maketrans({char: f"\\{char}" for char in "_*[]()~`>#+-=|{}.!"})
+
+# Values the store search sometimes puts in the city field
+_NON_CITY_NAMES = frozenset(("North Carolina", "NC", "United States"))
+
+# Street suffixes skipped when picking the city out of an address
+_STREET_SUFFIXES = frozenset(
+    (
+        "St",
+        "Street",
+        "Ave",
+        "Avenue",
+        "Rd",
+        "Road",
+        "Dr",
+        "Drive",
+        "Blvd",
+        "Boulevard",
+        "Ln",
+        "Lane",
+        "Ct",
+        "Court",
+        "Pl",
+        "Place",
+        "Cir",
+        "Circle",
+        "Way",
+        "Pkwy",
+        "Parkway",
+    )
+)
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """Create the application's event loop, using uvloop when it is installed"""
+    try:
+        import uvloop
+    except ImportError:
+        loop = asyncio.new_event_loop()
+    else:
+        loop = uvloop.new_event_loop()
+
+    # Coroutines that finish without suspending (empty watchlists, cache
+    # hits) then complete inside create_task instead of a later loop pass
+    loop.set_task_factory(asyncio.eager_task_factory)
+    return loop
+
+
+def run_async(main: Coroutine[Any, Any, Any]) -> Any:
+    """Run a coroutine to completion on the application's event loop"""
+    return asyncio.run(main, loop_factory=new_event_loop)
+
 
 class WakeABCCityCache:
     """Singleton cache for Wake ABC city locations"""
@@ -36,84 +103,132 @@ class WakeABCCityCache:
     _cache = None
     _timestamp = None
     _duration = 86400  # Cache for 24 hours
+    _refresh_task = None
+
+    # Only one fetch at a time per path: worker threads share the threading
+    # lock, and coroutines on the event loop share the asyncio one. An
+    # asyncio.Lock belongs to the loop it is first used on, so that one is
+    # created lazily, and again for each new event loop.
+    _lock = threading.Lock()
+    _async_lock = None
+    _async_lock_loop = None
+
+    _STORES_URL = "https://wakeabc.com/wp-admin/admin-ajax.php?action=store_search&lat=35.7795897&lng=-78.6381787&max_results=1000&search_radius=200"
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
+    def _is_fresh(self) -> bool:
+        """Check whether the cached city list is younger than the cache duration"""
+        return (
+            self._cache is not None
+            and self._timestamp is not None
+            and time.time() - self._timestamp < self._duration
+        )
+
     def get_wake_cities(self) -> List[str]:
         """
         Fetch Wake ABC store locations dynamically and extract city names.
         Results are cached for 24 hours to avoid excessive API calls.
+        On an event loop thread a stale cache is refreshed in the background
+        instead, and the current list (or the defaults) is returned meanwhile.
         """
 
         # Check if cache is still valid
-        current_time = time.time()
-        if (
-            self._cache is not None
-            and self._timestamp is not None
-            and current_time - self._timestamp < self._duration
-        ):
+        if self._is_fresh():
             return self._cache
 
         try:
-            # Fetch store locations from Wake ABC API
-            stores_url = "https://wakeabc.com/wp-admin/admin-ajax.php?action=store_search&lat=35.7795897&lng=-78.6381787&max_results=1000&search_radius=200"
-            response = requests.get(stores_url, timeout=10)
-            response.raise_for_status()
-        except Exception as e:
-            logger.warning(f"Failed to fetch Wake ABC store locations: {e}")
-            return _DEFAULT_CITIES
-
-        stores_data = response.json()
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = loop.create_task(self.refresh_async())
+            return self._cache or _DEFAULT_CITIES
+
+        with self._lock:
+            # Another thread may have refreshed the cache while we waited
+            if self._is_fresh():
+                return self._cache
+
+            try:
+                # Fetch store locations from Wake ABC API
+                response = requests.get(self._STORES_URL, timeout=10)
+                response.raise_for_status()
+            except Exception as e:
+                logger.warning(f"Failed to fetch Wake ABC store locations: {e}")
+                return _DEFAULT_CITIES
+
+            return self._store_cities(orjson.loads(response.content))
+
+    def _get_async_lock(self) -> asyncio.Lock:
+        """Return the fetch lock for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_lock is None or self._async_lock_loop is not loop:
+            self._async_lock = asyncio.Lock()
+            self._async_lock_loop = loop
+        return self._async_lock
+
+    async def refresh_async(self) -> List[str]:
+        """Fetch Wake ABC store locations without blocking the event loop"""
+        if self._is_fresh():
+            return self._cache
+
+        async with self._get_async_lock():
+            # Another task may have refreshed the cache while we waited
+            if self._is_fresh():
+                return self._cache
+
+            try:
+                timeout = aiohttp.ClientTimeout(total=10)
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with session.get(self._STORES_URL) as response:
+                        response.raise_for_status()
+                        stores_data = orjson.loads(await response.read())
+            except Exception as e:
+                logger.warning(f"Failed to fetch Wake ABC store locations: {e}")
+                return self._cache or _DEFAULT_CITIES
+
+            return self._store_cities(stores_data)
+
+    def _store_cities(self, stores_data: List[dict]) -> List[str]:
+        """Extract city names from the store search response and cache them"""
         cities = set()
 
         for store in stores_data:
             city = store.get("city", "").strip()
-            if city and city not in ["North Carolina", "NC", "United States"]:
+            if city and city not in _NON_CITY_NAMES:
                 cities.add(city)
 
         # Convert to sorted list for consistent ordering
-        wake_cities = sorted(list(cities))
+        wake_cities = sorted(cities)
 
-        # Update cache
+        # Update cache, dropping any parses made against the old city list
         self._cache = wake_cities
-        self._timestamp = current_time
+        self._timestamp = time.time()
+        _match_known_wake_cities.cache_clear()
+        extract_city_and_stock.cache_clear()
 
         logger.debug(f"Fetched {len(wake_cities)} Wake ABC cities: {wake_cities}")
         return wake_cities
 
 
+# City names, availability strings and stock counts repeat across every item
+@lru_cache(maxsize=4096)
 def escape_markdown(text: str) -> str:
     """Escape special characters for Telegram MarkdownV2"""
     if not text:
         return ""
-    special_chars = [
-        "_",
-        "*",
-        "[",
-        "]",
-        "(",
-        ")",
-        "~",
-        "`",
-        ">",
-        "#",
-        "+",
-        "-",
-        "=",
-        "|",
-        "{",
-        "}",
-        ".",
-        "!",
-    ]
-    for char in special_chars:
-        text = text.replace(char, f"\\{char}")
-    return text
+    return text.translate(_MARKDOWN_ESCAPES)
 
 
+# Wake ABC has a few dozen stores, so the same location strings recur in every
+# search and notification
+@lru_cache(maxsize=4096)
 def extract_city_and_stock(location_str: str) -> Tuple[Optional[str], int, str]:
     """Extract city and stock quantity from location string"""
     try:
@@ -183,7 +298,7 @@ def _extract_city_method_2(address: str) -> Optional[str]:
         return None
 
     # Use regex to find city name before ", STATE"
-    match = re.search(r"([A-Za-z\s]+),\s*[A-Z]{2}", address)
+    match = _CITY_STATE_RE.search(address)
     if not match:
         return None
 
@@ -198,6 +313,7 @@ def _extract_city_method_2(address: str) -> Optional[str]:
     return _parse_city_from_words(potential_city)
 
 
+@lru_cache(maxsize=1024)
 def _match_known_wake_cities(potential_city: str) -> Optional[str]:
     """Match potential city against known Wake ABC cities"""
     city_cache = WakeABCCityCache()
@@ -212,42 +328,17 @@ def _match_known_wake_cities(potential_city: str) -> Optional[str]:
 
 def _parse_city_from_words(potential_city: str) -> Optional[str]:
     """Parse city name from words by removing street elements"""
-    street_suffixes = [
-        "St",
-        "Street",
-        "Ave",
-        "Avenue",
-        "Rd",
-        "Road",
-        "Dr",
-        "Drive",
-        "Blvd",
-        "Boulevard",
-        "Ln",
-        "Lane",
-        "Ct",
-        "Court",
-        "Pl",
-        "Place",
-        "Cir",
-        "Circle",
-        "Way",
-        "Pkwy",
-        "Parkway",
-    ]
-
     words = potential_city.split()
     if len(words) <= 1:
         return potential_city
 
     # Look for a word that could be a city name
-    for i in range(len(words)):
-        word = words[i]
+    for i, word in enumerate(words):
+        # Cheapest checks first; a word with any digit is a street number
         if (
-            not word.isdigit()
-            and word not in street_suffixes
-            and not any(char.isdigit() for char in word)
-            and len(word) > 2
+            len(word) > 2
+            and word not in _STREET_SUFFIXES
+            and not any(map(str.isdigit, word))
         ):
             # Take this word and everything after it as the city
             return " ".join(words[i:])
@@ -271,19 +362,25 @@ def _clean_address_for_display(address: str, city: Optional[str]) -> str:
     if not city:
         return address
 
-    clean_address = address
-
     # Remove everything from ".CityName, NC zipcode" onward
-    if f".{city}, NC" in address:
-        clean_address = address.split(f".{city}, NC")[0]
+    index = address.find(f".{city}, NC")
     # Handle case without period: "StreetCityName, NC zipcode"
-    elif f"{city}, NC" in address:
-        clean_address = address.split(f"{city}, NC")[0]
+    if index == -1:
+        index = address.find(f"{city}, NC")
+    if index != -1:
+        return address[:index]
+
+    if not address.endswith(city):
+        return address
+
     # Handle case without comma: "Street.CityName"
-    elif f".{city}" in address and address.endswith(city):
-        clean_address = address.split(f".{city}")[0]
+    index = address.find(f".{city}")
+    if index != -1:
+        return address[:index]
+
     # Handle case with no period or comma: "StreetCityName"
-    elif address.endswith(city) and len(address) > len(city):
+    clean_address = address
+    if len(address) > len(city):
         potential_clean = address[: -len(city)]
         # Only clean if it ends with a space or punctuation (not a letter)
         if potential_clean and not potential_clean[-1].isalpha():
@@ -304,7 +401,31 @@ def _extract_stock_quantity(quantity_str: str) -> int:
     quantity_lower = quantity_str.lower()
     if "in stock" in quantity_lower:
         # Extract number from strings like "224 in stock"
-        numbers = re.findall(r"\d+", quantity_str)
-        if numbers:
-            stock_num = int(numbers[0])
+        match = _QUANTITY_RE.search(quantity_str)
+        if match:
+            stock_num = int(match.group())
     return stock_num
+
+
+def parse_price_cents(price: Optional[str]) -> Optional[int]:
+    """Convert a price like "$1,299.99" to integer cents, or None if unparseable"""
+    if not price:
+        return None
+    match = _PRICE_RE.fullmatch(price.replace("$", "").replace(",", "").strip())
+    if not match:
+        return None
+    dollars, cents = match.groups()
+    return int(dollars) * 100 + int((cents or "").ljust(2, "0"))
+
+
+def format_price_cents(cents: int) -> str:
+    """Format integer cents as a price such as $1,299.99"""
+    return f"${cents // 100:,}.{cents % 100:02d}"
+
+
+def parse_location_stock(location_str: str) -> int:
+    """Return the in-stock quantity of an "address - N in stock" location"""
+    address, quantity = _parse_location_string(location_str)
+    if quantity is None:
+        return 0
+    return _extract_stock_quantity(quantity)
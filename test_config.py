@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the log redaction applied by Config.setup_logging
+Run with pytest
+"""
+
+import logging
+
+import pytest
+
+config = pytest.importorskip("wakeabcbot.config")
+
+# Shaped like a real token, but not one
+_TOKEN = "123456789:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw"
+
+
+def _filtered(msg: str, *args) -> str:
+    """Run a record through SensitiveInfoFilter and return what would be logged"""
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    assert config.SensitiveInfoFilter().filter(record)
+    return record.getMessage()
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        # What run_bot logs when Telegram rejects the token (telegram.error.InvalidToken)
+        f"Error running bot: The token `{_TOKEN}` was rejected by the server.",
+        f"TELEGRAM_BOT_TOKEN='{_TOKEN}'",
+        f'bot_token: "{_TOKEN}"',
+        f"Using {_TOKEN}",
+        f"POST https://api.telegram.org/bot{_TOKEN}/sendMessage",
+        f"token={_TOKEN}",
+    ],
+)
+def test_token_redacted(message):
+    """Test if bot tokens are redacted wherever they appear in a log message"""
+    logged = _filtered(message)
+    assert _TOKEN not in logged
+    assert _TOKEN.split(":")[1] not in logged
+
+
+def test_token_in_args_redacted():
+    """Test if a token passed as a formatting argument is redacted"""
+    assert _TOKEN not in _filtered("Using token %s", _TOKEN)
+
+
+def test_plain_message_unchanged():
+    """Test if messages without secrets are logged unchanged"""
+    message = "Checking 12 keywords at 10:30: bourbon, gin"
+    assert _filtered(message) == message
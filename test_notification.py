@@ -1,58 +1,34 @@
 #!/usr/bin/env python3
 """
-Test script for the notification system.
+Test for the notification system.
 Sends a test notification to verify the bot is working correctly.
+Run with pytest --user-id=<USER_ID> [--user-id=<USER_ID> ...],
+or directly: python test_notification.py <USER_ID> [<USER_ID> ...]
 """
 
 import asyncio
 import logging
 import sys
 
-from src.wakeabcbot.config import Config
-from src.wakeabcbot.monitor import MonitoringService
+import pytest
 
 logger = logging.getLogger(__name__)
 
 
-async def test_notification():
+# Same loop as the session-scoped service, whose connections are bound to it
+@pytest.mark.asyncio(loop_scope="session")
+async def test_notification(user_ids, monitoring_service):
     """Test the notification system by sending a test notification"""
-    try:
-        # Set up secure logging and validate configuration
-        Config.setup_logging()
-        Config.validate_config()
-
-        # Get user ID from command line argument or use a placeholder
-        if len(sys.argv) > 1:
-            try:
-                user_id = int(sys.argv[1])
-            except ValueError:
-                logger.error("Invalid user ID. Please provide a numeric user ID.")
-                print("Usage: python test_notification.py <USER_ID>")
-                return False
-        else:
-            logger.error("Please provide a user ID as a command line argument.")
-            print("Usage: python test_notification.py <USER_ID>")
-            print("Example: python test_notification.py 123456789")
-            return False
-
-        logger.info(f"Testing notification system for user ID: {user_id}")
-
-        # Create monitoring service instance
-        service = MonitoringService(Config.TELEGRAM_BOT_TOKEN)
+    logger.info(f"Testing notification system for user IDs: {user_ids}")
 
-        # Send test notification
-        await service.send_test_notification(user_id)
+    # Send test notifications, all at once over the service's connection pool
+    sent = await asyncio.gather(
+        *(monitoring_service.send_test_notification(user_id) for user_id in user_ids)
+    )
 
-        logger.info("✅ Test notification sent successfully!")
-        return True
-
-    except ValueError as e:
-        logger.error(f"Configuration error: {e}")
-        logger.error("Please make sure your .env file contains TELEGRAM_BOT_TOKEN")
-        return False
-    except Exception as e:
-        logger.error(f"Error sending test notification: {e}")
-        return False
+    failed = [user_id for user_id, ok in zip(user_ids, sent) if not ok]
+    assert not failed, f"Error sending test notification to: {failed}"
+    logger.info("✅ Test notifications sent successfully!")
 
 
 def main():
@@ -60,21 +36,21 @@ def main():
     print("🧪 Wake ABC Bot - Notification Test")
     print("=" * 40)
 
+    # Get user IDs from command line arguments
     try:
-        result = asyncio.run(test_notification())
-        if result:
-            print("\n✅ Test completed successfully!")
-        else:
-            print("\n❌ Test failed!")
-            sys.exit(1)
-    except KeyboardInterrupt:
-        print("\n👋 Test interrupted by user")
-        sys.exit(0)
-    except Exception as e:
-        logger.error(f"Test failed with error: {e}")
-        print(f"\n❌ Test failed: {e}")
-        sys.exit(1)
+        user_ids = [int(arg) for arg in sys.argv[1:]]
+    except ValueError:
+        user_ids = []
+
+    if not user_ids:
+        print("Usage: python test_notification.py <USER_ID> [<USER_ID> ...]")
+        print("Example: python test_notification.py 123456789 987654321")
+        return 1
+
+    return pytest.main(
+        ["-x", __file__, *(f"--user-id={user_id}" for user_id in user_ids)]
+    )
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,200 +1,251 @@
 #!/usr/bin/env python3
 """
-Test script to verify Wake ABC Telegram Bot setup
+Tests to verify Wake ABC Telegram Bot setup
+Run with pytest, or directly: python test_setup.py
 """
 
-import asyncio
+import hashlib
+import importlib
+import importlib.metadata
+import importlib.util
 import os
+import re
 import sys
+import time
+import warnings
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import pytest
+
+# Checked once at import; nothing below is worth running on an older Python
+_PY_VERSION = sys.version_info
+_PY_OK = _PY_VERSION >= (3, 12)
+_PY_VERSION_MESSAGE = (
+    f"Python {_PY_VERSION.major}.{_PY_VERSION.minor}.{_PY_VERSION.micro} - Need 3.12+"
+)
+
+if not _PY_OK:
+    pytest.skip(_PY_VERSION_MESSAGE, allow_module_level=True)
+
+# Minimal search results page with a single in-stock product
+_SEARCH_RESULTS_HTML = """
+<div id="productSearchResults">
+  <div class="wake-product">
+    <h4>Test Whiskey</h4>
+    <small>PLU: 12345</small>
+    <span class="size">750ml</span>
+    <span class="price">$29.95</span>
+    <div class="inventory-collapse">
+      <ul>
+        <li>
+          <span class="address">1000 Main St.<br>Raleigh, NC 27601</span>
+          <span class="quantity">24 in stock</span>
+        </li>
+      </ul>
+    </div>
+  </div>
+</div>
+"""
 
 
-def test_python_version():
-    """Test if Python version is 3.12 or higher"""
-    print("🐍 Testing Python version...")
-    version = sys.version_info
-    if version.major == 3 and version.minor >= 12:
-        print(f"✅ Python {version.major}.{version.minor}.{version.micro} - OK")
-        return True
-    else:
-        print(f"❌ Python {version.major}.{version.minor}.{version.micro} - Need 3.12+")
-        return False
+@lru_cache(maxsize=1)
+def _dotenv_values() -> Dict[str, Optional[str]]:
+    """Parse .env once, however many times the tests are run in this process"""
+    dotenv_values = pytest.importorskip("dotenv").dotenv_values
+    return dotenv_values(".env")
 
 
-def test_dependencies():
-    """Test if all required dependencies are installed"""
-    print("\n📦 Testing dependencies...")
-    required_modules = [
+# Top-level modules the bot imports at runtime
+_REQUIRED_MODULES = frozenset(
+    {
         "telegram",
         "requests",
-        "bs4",
-        "lxml",
+        "selectolax",
         "schedule",
         "dotenv",
         "aiohttp",
-    ]
+        "orjson",
+    }
+)
 
-    all_ok = True
-    for module in required_modules:
-        try:
-            __import__(module)
-            print(f"✅ {module} - OK")
-        except ImportError:
-            print(f"❌ {module} - Missing")
-            all_ok = False
+# Opt-in, so CI always validates from scratch
+_CACHE_TESTS = os.getenv("WAKEABCBOT_CACHE_TESTS") == "1"
 
-    return all_ok
 
+def _installed_packages() -> str:
+    """Names and versions of every installed distribution, like pip freeze"""
+    return "\n".join(
+        sorted(
+            f"{dist.metadata['Name']}=={dist.version}"
+            for dist in importlib.metadata.distributions()
+        )
+    )
 
-def test_config_file():
-    """Test if configuration file exists"""
-    print("\n⚙️  Testing configuration...")
-    env_file = Path(".env")
 
-    if not env_file.exists():
-        print("❌ .env file not found")
-        print("   Please copy env.example to .env and configure it")
-        return False
+def _env_file_signature() -> str:
+    """Modification time of .env, which changes whenever the token does"""
+    try:
+        return str(Path(".env").stat().st_mtime_ns)
+    except FileNotFoundError:
+        return "missing"
+
+
+@contextmanager
+def _cached_check(
+    request, *inputs: str, max_age: Optional[float] = None
+) -> Iterator[None]:
+    """Skip a check that last passed with the same inputs, and record new passes"""
+    if not _CACHE_TESTS:
+        yield
+        return
+
+    cache_key = f"wakeabcbot/setup/{request.node.name}"
+    signature = hashlib.sha1("\0".join((sys.version, *inputs)).encode()).hexdigest()
+
+    # Results depending on remote state are only trusted for max_age seconds
+    cached = request.config.cache.get(cache_key, None)
+    if (
+        cached
+        and cached["signature"] == signature
+        and (max_age is None or time.time() - cached["passed_at"] < max_age)
+    ):
+        pytest.skip("Passed before with the same environment (cached)")
+
+    yield
+    request.config.cache.set(
+        cache_key, {"signature": signature, "passed_at": time.time()}
+    )
 
-    print("✅ .env file found")
 
-    # Test if bot token is configured
-    from dotenv import load_dotenv
+def test_python_version():
+    """Test if Python version is 3.12 or higher"""
+    assert _PY_OK, _PY_VERSION_MESSAGE
 
-    load_dotenv()
 
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not bot_token or bot_token == "your_bot_token_here":
-        print("❌ TELEGRAM_BOT_TOKEN not configured")
-        print("   Please set your bot token in .env file")
-        return False
+def test_dependencies(request):
+    """Test if all required dependencies are installed"""
+    # Locating a module is enough to know it is installed; --deep also
+    # imports it, to catch modules that are present but broken
+    deep = request.config.getoption("--deep")
 
-    print("✅ Bot token configured")
-    return True
+    inputs = (str(deep), _installed_packages()) if _CACHE_TESTS else ()
+    with _cached_check(request, *inputs):
+        _check_dependencies(deep)
 
 
-async def test_bot_connection():
-    """Test if bot can connect to Telegram"""
-    print("\n🤖 Testing bot connection...")
+def _check_dependencies(deep: bool):
+    """Assert that every required module can be found, or imported if deep"""
+    missing = set()
+    for module in _REQUIRED_MODULES:
+        if deep:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                missing.add(module)
+        elif importlib.util.find_spec(module) is None:
+            missing.add(module)
 
-    try:
-        from telegram import Bot
+    assert not missing, f"Missing modules: {', '.join(sorted(missing))}"
 
-        from wakeabcbot.config import Config
 
-        if (
-            not Config.TELEGRAM_BOT_TOKEN
-            or Config.TELEGRAM_BOT_TOKEN == "your_bot_token_here"
-        ):
-            print("❌ Bot token not configured")
-            return False
+def test_config_file(request):
+    """Test if configuration file exists"""
+    with _cached_check(request, _env_file_signature()):
+        _check_config_file()
 
-        bot = Bot(token=Config.TELEGRAM_BOT_TOKEN)
-        me = await bot.get_me()
-        print(f"✅ Connected to bot: @{me.username} ({me.first_name})")
-        return True
 
-    except Exception as e:
-        print(f"❌ Bot connection failed: {e}")
-        return False
+def _check_config_file():
+    """Assert that .env exists and sets a real bot token"""
+    env_file = Path(".env")
+    assert env_file.exists(), (
+        ".env file not found. Please copy env.example to .env and configure it"
+    )
 
+    # Test if bot token is configured
+    Config = pytest.importorskip("wakeabcbot.config").Config
+    bot_token = _dotenv_values().get("TELEGRAM_BOT_TOKEN")
+    assert Config.is_valid_token(bot_token), (
+        "TELEGRAM_BOT_TOKEN not configured or malformed. Please set your bot token in .env file"
+    )
 
-def test_scraper():
-    """Test if inventory scraper works"""
-    print("\n🔍 Testing inventory scraper...")
 
-    try:
-        from wakeabcbot.inventory_scraper import WakeABCInventoryScraper
+def test_database(db):
+    """Test if database operations work"""
+    db.add_user(12345, "testuser")
+    db.add_watchlist_keyword(12345, "test")
+    keywords = db.get_user_watchlist(12345)
 
-        scraper = WakeABCInventoryScraper()
-        print("✅ Scraper initialized")
+    assert "test" in keywords, "Database test failed"
 
-        # Try a simple search
-        results = scraper.search_inventory("whiskey", max_results=1)
-        if results:
-            print(f"✅ Search test successful - found {len(results)} result(s)")
-        else:
-            print("⚠️  Search returned no results (may be normal)")
 
-        return True
+def test_scraper():
+    """Test if inventory scraper parses a search results page"""
+    responses = pytest.importorskip("responses")
+    WakeABCInventoryScraper = pytest.importorskip(
+        "wakeabcbot.inventory_scraper"
+    ).WakeABCInventoryScraper
+
+    # A scraper of its own, so the shared one's search cache never holds
+    # these canned results
+    scraper = WakeABCInventoryScraper()
+    try:
+        with responses.RequestsMock() as mock:
+            mock.add(
+                responses.POST,
+                re.compile(r"https://wakeabc\.com/search-results"),
+                body=_SEARCH_RESULTS_HTML,
+            )
+            results = scraper.search_inventory("whiskey", max_results=1)
+    finally:
+        scraper.session.close()
+
+    assert len(results) == 1, "Scraper found no products in the search results"
+    item = results[0]
+    assert (item.name, item.code, item.price) == ("Test Whiskey", "12345", "$29.95")
+    assert item.locations == ["1000 Main St.Raleigh, NC 27601 - 24 in stock"]
+
+
+# Network checks get a time limit so a hung connection fails instead of
+# holding up the whole run
+@pytest.mark.network
+@pytest.mark.timeout(10)
+def test_scraper_live(scraper):
+    """Test if inventory scraper can search the live Wake ABC site"""
+    # Try a simple search
+    results = scraper.search_inventory("whiskey", max_results=1)
+    if not results:
+        warnings.warn("Search returned no results (may be normal)")
+
+
+@pytest.mark.network
+@pytest.mark.timeout(10)
+@pytest.mark.asyncio
+async def test_bot_connection(request, bot):
+    """Test if bot can connect to Telegram"""
+    # The bot's identity rarely changes, so a successful connection with the
+    # same token is trusted for a day
+    with _cached_check(request, bot.token, max_age=24 * 60 * 60):
+        me = await bot.get_me()
+        assert me.username, "Bot connection failed"
 
-    except Exception as e:
-        print(f"❌ Scraper test failed: {e}")
-        return False
 
+def main():
+    """Run all setup tests, reporting each one"""
+    # Run directly, this is the full setup check, so the live Telegram and
+    # Wake ABC checks are included
+    args = ["-v", "--tb=short", "--network", __file__]
 
-def test_database():
-    """Test if database operations work"""
-    print("\n🗄️  Testing database...")
+    # The checks are independent, so the slow network ones (scraper, bot
+    # connection) can overlap when pytest-xdist is installed
+    if importlib.util.find_spec("xdist") is not None:
+        # At most one worker per check
+        args += ["-n", "auto", "--maxprocesses", "6"]
 
-    try:
-        from wakeabcbot.database import Database
-
-        db = Database(":memory:")  # Use in-memory database for testing
-
-        # Test basic operations
-        db.add_user(12345, "testuser")
-        db.add_watchlist_keyword(12345, "test")
-        keywords = db.get_user_watchlist(12345)
-
-        if "test" in keywords:
-            print("✅ Database operations working")
-            return True
-        else:
-            print("❌ Database test failed")
-            return False
-
-    except Exception as e:
-        print(f"❌ Database test failed: {e}")
-        return False
-
-
-async def main():
-    """Run all tests"""
-    print("🧪 Wake ABC Telegram Bot - Setup Test\n")
-
-    tests = [
-        ("Python Version", test_python_version),
-        ("Dependencies", test_dependencies),
-        ("Configuration", test_config_file),
-        ("Database", test_database),
-        ("Scraper", test_scraper),
-        ("Bot Connection", test_bot_connection),
-    ]
-
-    results = []
-    for test_name, test_func in tests:
-        try:
-            if asyncio.iscoroutinefunction(test_func):
-                result = await test_func()
-            else:
-                result = test_func()
-            results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ {test_name} test crashed: {e}")
-            results.append((test_name, False))
-
-    print("\n" + "=" * 50)
-    print("📊 Test Results Summary:")
-    print("=" * 50)
-
-    all_passed = True
-    for test_name, passed in results:
-        status = "✅ PASS" if passed else "❌ FAIL"
-        print(f"{status} - {test_name}")
-        if not passed:
-            all_passed = False
-
-    print("=" * 50)
-    if all_passed:
-        print("🎉 All tests passed! Your bot is ready to run.")
-        print("   Start it with: python3 main.py or ./run.sh")
-    else:
-        print("⚠️  Some tests failed. Please fix the issues above.")
-        print("   Check the README.md for setup instructions.")
-
-    return 0 if all_passed else 1
+    return pytest.main(args)
 
 
 if __name__ == "__main__":
-    sys.exit(asyncio.run(main()))
+    sys.exit(main())